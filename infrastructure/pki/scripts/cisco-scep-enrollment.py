@@ -1,76 +1,1029 @@
 #!/usr/bin/env python3
 # cisco_scep_enrollment.py
 
-import requests
 import hashlib
 import base64
+import argparse
+import csv
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 from cryptography import x509
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+from cryptography.hazmat.primitives.serialization import pkcs7
+
+import pki_transport
+
+# Key types for build_csr and the keygen benchmark
+KEY_TYPES = ("rsa", "ec-p256", "ec-p384")
+# SCEP enrollment needs RSA: the CA encrypts its reply to the requester key
+ENROLL_KEY_TYPES = ("rsa",)
+
+# GetCACaps hash names, strongest first
+HASH_PREFERENCE = (
+    ("SHA-512", hashes.SHA512),
+    ("SHA-256", hashes.SHA256),
+    ("SHA-1", hashes.SHA1),
+)
+
+
+# pkiMessage types and CertRep pkiStatus values (RFC 8894 section 3.2.1)
+MESSAGE_CERT_REP = "3"
+MESSAGE_PKCS_REQ = "19"
+MESSAGE_CERT_POLL = "20"
+STATUS_SUCCESS = "0"
+STATUS_FAILURE = "2"
+STATUS_PENDING = "3"
+FAIL_INFO = {
+    "0": "badAlg",
+    "1": "badMessageCheck",
+    "2": "badRequest",
+    "3": "badTime",
+    "4": "badCertId",
+}
+
+OID_DATA = "1.2.840.113549.1.7.1"
+OID_SIGNED_DATA = "1.2.840.113549.1.7.2"
+OID_CONTENT_TYPE = "1.2.840.113549.1.9.3"
+OID_MESSAGE_DIGEST = "1.2.840.113549.1.9.4"
+OID_RSA_ENCRYPTION = "1.2.840.113549.1.1.1"
+OID_MESSAGE_TYPE = "2.16.840.1.113733.1.9.2"
+OID_PKI_STATUS = "2.16.840.1.113733.1.9.3"
+OID_FAIL_INFO = "2.16.840.1.113733.1.9.4"
+OID_SENDER_NONCE = "2.16.840.1.113733.1.9.5"
+OID_RECIPIENT_NONCE = "2.16.840.1.113733.1.9.6"
+OID_TRANSACTION_ID = "2.16.840.1.113733.1.9.7"
+DIGEST_OIDS = {
+    "sha1": "1.3.14.3.2.26",
+    "sha256": "2.16.840.1.101.3.4.2.1",
+    "sha384": "2.16.840.1.101.3.4.2.2",
+    "sha512": "2.16.840.1.101.3.4.2.3",
+}
+
+
+class SCEPPending(Exception):
+    """NDES returned pkiStatus PENDING; the request awaits manual approval"""
+
+    def __init__(self, transaction_id=None):
+        super().__init__(f"Enrollment pending (transaction {transaction_id})")
+        self.transaction_id = transaction_id
+
+
+class SCEPError(Exception):
+    """Enrollment failure that retrying the same request cannot fix"""
+
+
+class SCEPRejected(SCEPError):
+    """The CA answered with pkiStatus FAILURE"""
+
+    def __init__(self, fail_info):
+        super().__init__(f"CA rejected the request: {fail_info}")
+        self.fail_info = fail_info
+
+
+# Minimal DER encoding and decoding for the CMS structures SCEP wraps around
+# the CSR; cryptography builds and opens the EnvelopedData itself.
+
+
+def _der(tag, value):
+    length = len(value)
+    if length < 0x80:
+        return bytes([tag, length]) + value
+    size = (length.bit_length() + 7) // 8
+    return bytes([tag, 0x80 | size]) + length.to_bytes(size, "big") + value
+
+
+def _der_int(value):
+    return _der(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def _der_oid(dotted):
+    arcs = [int(arc) for arc in dotted.split(".")]
+    body = b""
+    for arc in [arcs[0] * 40 + arcs[1]] + arcs[2:]:
+        chunk = [arc & 0x7F]
+        while arc > 0x7F:
+            arc >>= 7
+            chunk.append(0x80 | arc & 0x7F)
+        body += bytes(reversed(chunk))
+    return _der(0x06, body)
+
+
+def _der_seq(*items):
+    return _der(0x30, b"".join(items))
+
+
+def _der_set(*items):
+    # DER orders SET OF members by their encoding
+    return _der(0x31, b"".join(sorted(items)))
+
+
+def _der_attribute(oid, value):
+    return _der_seq(_der_oid(oid), _der_set(value))
+
+
+def _der_read(data, offset=0):
+    """(tag, value, raw) of the element at offset, plus the offset after it"""
+    start = offset
+    tag, length = data[offset], data[offset + 1]
+    offset += 2
+    if length == 0x80:
+        # BER indefinite length: children run up to an end-of-contents marker
+        end = offset
+        while data[end : end + 2] != b"\x00\x00":
+            end = _der_read(data, end)[1]
+        return (tag, data[offset:end], data[start : end + 2]), end + 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset : offset + size], "big")
+        offset += size
+    if offset + length > len(data):
+        raise ValueError("Truncated DER element")
+    end = offset + length
+    return (tag, data[offset:end], data[start:end]), end
+
+
+def _der_children(value):
+    children, offset = [], 0
+    while offset < len(value):
+        child, offset = _der_read(value, offset)
+        children.append(child)
+    return children
+
+
+def _der_octets(tag, value):
+    # Constructed OCTET STRINGs (BER) are the concatenation of their parts
+    if tag == 0x24:
+        return b"".join(_der_octets(*child[:2]) for child in _der_children(value))
+    return value
+
+
+def _signer_certificate(private_key, subject, algorithm):
+    # Self-signed certificate identifying the requester until the CA issues one
+    now = datetime.now(timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(subject)
+        .public_key(private_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(hours=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(private_key, algorithm)
+    )
+
+
+def generate_key(key_size=2048, key_type="rsa"):
+    """RSA key of key_size bits, or an ECDSA P-256/P-384 key"""
+    if key_type == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=key_size)
+    if key_type == "ec-p256":
+        return ec.generate_private_key(ec.SECP256R1())
+    if key_type == "ec-p384":
+        return ec.generate_private_key(ec.SECP384R1())
+    raise ValueError(f"Unsupported key type: {key_type}")
+
+
+def build_csr(common_name, key_size=2048, key_type="rsa", challenge_password=None):
+    """Generate a private key and signed CSR for common_name"""
+    # Generate private key
+    private_key = generate_key(key_size, key_type)
+
+    # Build CSR
+    subject = x509.Name(
+        [
+            x509.NameAttribute(x509.oid.NameOID.COMMON_NAME, common_name),
+            x509.NameAttribute(x509.oid.NameOID.ORGANIZATION_NAME, "Company"),
+            x509.NameAttribute(x509.oid.NameOID.COUNTRY_NAME, "AU"),
+        ]
+    )
+
+    builder = (
+        x509.CertificateSigningRequestBuilder()
+        .subject_name(subject)
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [
+                    x509.DNSName(common_name),
+                    x509.DNSName(f"{common_name}.company.com.au"),
+                ]
+            ),
+            critical=False,
+        )
+    )
+    # NDES authenticates the enrollment by the CSR challengePassword
+    if challenge_password:
+        builder = builder.add_attribute(
+            x509.oid.AttributeOID.CHALLENGE_PASSWORD, challenge_password.encode()
+        )
+    csr = builder.sign(
+        private_key,
+        hashes.SHA384() if key_type == "ec-p384" else hashes.SHA256(),
+    )
+
+    return private_key, csr
+
+
+def _build_csr_der(common_name, key_size, key_type, challenge_password):
+    # Process pool entry point: key objects cannot be pickled, so return DER
+    private_key, csr = build_csr(common_name, key_size, key_type, challenge_password)
+    key_der = private_key.private_bytes(
+        serialization.Encoding.DER,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return key_der, csr.public_bytes(serialization.Encoding.DER)
+
+
+class KeygenPool:
+    """Key generation and CSR signing spread across worker processes"""
+
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.processes)
+
+    def generate_csr(
+        self, common_name, key_size=2048, key_type="rsa", challenge_password=None
+    ):
+        """Same contract as SCEPClient.generate_csr, run in a worker process"""
+        key_der, csr_der = self._executor.submit(
+            _build_csr_der, common_name, key_size, key_type, challenge_password
+        ).result()
+        private_key = serialization.load_der_private_key(
+            key_der, password=None, unsafe_skip_rsa_key_validation=True
+        )
+        return private_key, x509.load_der_x509_csr(csr_der)
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+def benchmark_keygen(count=50, processes=None):
+    """Print keys+CSRs per second for each key type, inline and in a process pool"""
+    pool = KeygenPool(processes)
+    # Start every worker process before timing
+    list(
+        ThreadPoolExecutor(pool.processes).map(
+            lambda i: pool.generate_csr(f"warmup{i}", key_type="ec-p256"),
+            range(pool.processes),
+        )
+    )
+
+    print(f"{'key type':<10} {'mode':<14} {'keys/s':>8} {'ms/key':>8}")
+    try:
+        for key_type, key_size in (
+            ("rsa", 2048),
+            ("rsa", 3072),
+            ("ec-p256", None),
+            ("ec-p384", None),
+        ):
+            label = f"rsa{key_size}" if key_type == "rsa" else key_type
+
+            start = time.perf_counter()
+            for i in range(count):
+                build_csr(f"bench{i}", key_size or 2048, key_type)
+            inline = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=pool.processes) as threads:
+                list(
+                    threads.map(
+                        lambda i: pool.generate_csr(
+                            f"bench{i}", key_size or 2048, key_type
+                        ),
+                        range(count),
+                    )
+                )
+            pooled = time.perf_counter() - start
+
+            for mode, elapsed in (
+                ("inline", inline),
+                (f"process x{pool.processes}", pooled),
+            ):
+                print(
+                    f"{label:<10} {mode:<14} {count / elapsed:>8.1f} "
+                    f"{elapsed / count * 1000:>8.2f}"
+                )
+    finally:
+        pool.shutdown()
+
+
+def _is_ca(cert):
+    try:
+        return cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+    except x509.ExtensionNotFound:
+        return False
 
 
 class SCEPClient:
-    def __init__(self, scep_url, challenge_password):
+    def __init__(
+        self,
+        scep_url,
+        challenge_password,
+        session=None,
+        cache_dir=None,
+        cache_ttl=86400,
+    ):
         self.scep_url = scep_url
         self.challenge = challenge_password
+        self.session = session or pki_transport.create_session("scep", hosts=1)
+        self.cache_dir = cache_dir  # None keeps GetCACert/GetCACaps in memory only
+        self.cache_ttl = cache_ttl
+        self._ca_certs = None  # (expires, certs)
+        self._ca_caps = None  # (fingerprint, expires, caps)
+        self._cache_lock = threading.Lock()
 
     def get_ca_cert(self):
         """Retrieve CA certificate"""
-        response = requests.get(
-            f"{self.scep_url}?operation=GetCACert",
-            headers={"Content-Type": "application/x-pki-message"},
-        )
-        return x509.load_der_x509_certificate(response.content)
-
-    def generate_csr(self, common_name, key_size=2048):
-        """Generate key pair and CSR"""
-        # Generate private key
-        private_key = rsa.generate_private_key(public_exponent=65537, key_size=key_size)
-
-        # Build CSR
-        subject = x509.Name(
-            [
-                x509.NameAttribute(x509.oid.NameOID.COMMON_NAME, common_name),
-                x509.NameAttribute(x509.oid.NameOID.ORGANIZATION_NAME, "Company"),
-                x509.NameAttribute(x509.oid.NameOID.COUNTRY_NAME, "AU"),
+        return self.get_ca_certs()[0]
+
+    def get_ca_certs(self):
+        """CA certificate followed by any RA certificates, cached"""
+        with self._cache_lock:
+            if self._ca_certs is None or time.time() >= self._ca_certs[0]:
+                self._ca_certs = self._load_ca_certs()
+            return self._ca_certs[1]
+
+    def _load_ca_certs(self):
+        path = self.cache_dir and self._cache_path("cacert")
+        entry = path and self._read_cache(path)
+        if entry:
+            certs = [
+                x509.load_pem_x509_certificate(pem.encode()) for pem in entry["certs"]
             ]
+            return entry["expires"], certs
+
+        response = self.session.get(f"{self.scep_url}?operation=GetCACert")
+        response.raise_for_status()
+
+        # NDES in RA mode returns a degenerate PKCS#7 holding the RA certs and CA
+        if "ca-ra-cert" in response.headers.get("Content-Type", ""):
+            certs = pkcs7.load_der_pkcs7_certificates(response.content)
+        else:
+            certs = [x509.load_der_x509_certificate(response.content)]
+        certs.sort(key=lambda cert: not _is_ca(cert))
+
+        # Revalidate after the TTL, or sooner if any certificate expires first
+        expires = min(
+            [time.time() + self.cache_ttl]
+            + [cert.not_valid_after_utc.timestamp() for cert in certs]
         )
+        if path:
+            self._write_cache(
+                path,
+                {
+                    "scep_url": self.scep_url,
+                    "fingerprint": certs[0].fingerprint(hashes.SHA256()).hex(),
+                    "expires": expires,
+                    "certs": [
+                        cert.public_bytes(serialization.Encoding.PEM).decode()
+                        for cert in certs
+                    ],
+                },
+            )
+        return expires, certs
+
+    def get_ca_caps(self):
+        """Capabilities from GetCACaps, cached per CA fingerprint"""
+        fingerprint = self.get_ca_cert().fingerprint(hashes.SHA256()).hex()
+        with self._cache_lock:
+            if (
+                self._ca_caps
+                and self._ca_caps[0] == fingerprint
+                and time.time() < self._ca_caps[1]
+            ):
+                return self._ca_caps[2]
+
+            path = self.cache_dir and self._cache_path("cacaps", fingerprint)
+            entry = path and self._read_cache(path)
+            if entry:
+                caps, expires = frozenset(entry["caps"]), entry["expires"]
+            else:
+                response = self.session.get(f"{self.scep_url}?operation=GetCACaps")
+                # Servers without GetCACaps answer with an error: assume no caps
+                caps = frozenset(
+                    line.strip().upper()
+                    for line in (response.text if response.ok else "").splitlines()
+                    if line.strip()
+                )
+                expires = time.time() + self.cache_ttl
+                if path:
+                    self._write_cache(
+                        path,
+                        {
+                            "scep_url": self.scep_url,
+                            "fingerprint": fingerprint,
+                            "expires": expires,
+                            "caps": sorted(caps),
+                        },
+                    )
+
+            self._ca_caps = (fingerprint, expires, caps)
+            return caps
+
+    def hash_algorithm(self):
+        """Strongest message digest the CA advertises"""
+        caps = self.get_ca_caps()
+        # SCEPStandard (RFC 8894) implies SHA-256
+        if "SCEPSTANDARD" in caps:
+            caps = caps | {"SHA-256"}
+        for name, algorithm in HASH_PREFERENCE:
+            if name in caps:
+                return algorithm()
+        return hashes.SHA1()
+
+    def _cache_path(self, kind, *parts):
+        key = hashlib.sha256("|".join((self.scep_url,) + parts).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{kind}-{key[:32]}.json")
+
+    def _read_cache(self, path):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("scep_url") != self.scep_url or time.time() >= entry["expires"]:
+            return None
+        return entry
+
+    def _write_cache(self, path, entry):
+        # Write then rename so concurrent runs never read a partial file
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def generate_csr(
+        self, common_name, key_size=2048, key_type="rsa", challenge_password=None
+    ):
+        """Generate key pair and CSR carrying the enrollment challenge"""
+        return build_csr(
+            common_name, key_size, key_type, challenge_password or self.challenge
+        )
+
+    def recipient_certificate(self):
+        """RA encryption certificate when NDES runs in RA mode, else the CA"""
+        certs = self.get_ca_certs()
+        for cert in certs[1:]:
+            try:
+                usage = cert.extensions.get_extension_for_class(x509.KeyUsage).value
+            except x509.ExtensionNotFound:
+                continue
+            if usage.key_encipherment:
+                return cert
+        return certs[0]
+
+    def create_pkcs7_request(
+        self, csr, private_key, hash_algorithm, message_type=MESSAGE_PKCS_REQ
+    ):
+        """Signed PKCSReq or CertPoll pkiMessage.
+
+        Returns (message, transaction_id, sender_nonce, signer_certificate);
+        the CA encrypts its CertRep to the signer certificate.
+        """
+        if not isinstance(private_key, rsa.RSAPrivateKey):
+            raise SCEPError(
+                "SCEP enrollment needs an RSA key: the CA encrypts its reply to it"
+            )
+        der = serialization.Encoding.DER
+
+        # Derived from the public key, so a poll or resend keeps the same ID
+        transaction_id = hashlib.sha256(
+            csr.public_key().public_bytes(
+                der, serialization.PublicFormat.SubjectPublicKeyInfo
+            )
+        ).hexdigest()
+        sender_nonce = os.urandom(16)
+        signer = _signer_certificate(private_key, csr.subject, hash_algorithm)
 
-        csr = (
-            x509.CertificateSigningRequestBuilder()
-            .subject_name(subject)
-            .add_extension(
-                x509.SubjectAlternativeName(
-                    [
-                        x509.DNSName(common_name),
-                        x509.DNSName(f"{common_name}.company.com.au"),
-                    ]
-                ),
-                critical=False,
+        if message_type == MESSAGE_CERT_POLL:
+            # IssuerAndSubject
+            content = _der_seq(
+                self.get_ca_cert().subject.public_bytes(), csr.subject.public_bytes()
             )
-            .sign(private_key, hashes.SHA256())
+        else:
+            content = csr.public_bytes(der)
+        # AES-128-CBC, which NDES and any SCEPStandard CA accept
+        envelope = (
+            pkcs7.PKCS7EnvelopeBuilder()
+            .set_data(content)
+            .add_recipient(self.recipient_certificate())
+            .encrypt(der, [pkcs7.PKCS7Options.Binary])
         )
 
-        return private_key, csr
+        digest = hashes.Hash(hash_algorithm)
+        digest.update(envelope)
+        signed_attributes = _der_set(
+            _der_attribute(OID_CONTENT_TYPE, _der_oid(OID_DATA)),
+            _der_attribute(OID_MESSAGE_DIGEST, _der(0x04, digest.finalize())),
+            _der_attribute(OID_MESSAGE_TYPE, _der(0x13, message_type.encode())),
+            _der_attribute(OID_TRANSACTION_ID, _der(0x13, transaction_id.encode())),
+            _der_attribute(OID_SENDER_NONCE, _der(0x04, sender_nonce)),
+        )
+        signature = private_key.sign(
+            signed_attributes, padding.PKCS1v15(), hash_algorithm
+        )
 
-    def enroll_certificate(self, csr):
-        """Submit SCEP enrollment request"""
-        # Create PKCS#7 message
-        pkcs7_data = self.create_pkcs7_request(csr)
+        digest_algorithm = _der_seq(
+            _der_oid(DIGEST_OIDS[hash_algorithm.name]), b"\x05\x00"
+        )
+        signer_info = _der_seq(
+            _der_int(1),
+            _der_seq(signer.issuer.public_bytes(), _der_int(signer.serial_number)),
+            digest_algorithm,
+            # Signed as a SET, carried as [0] IMPLICIT
+            b"\xa0" + signed_attributes[1:],
+            _der_seq(_der_oid(OID_RSA_ENCRYPTION), b"\x05\x00"),
+            _der(0x04, signature),
+        )
+        signed_data = _der_seq(
+            _der_int(1),
+            _der_set(digest_algorithm),
+            _der_seq(_der_oid(OID_DATA), _der(0xA0, _der(0x04, envelope))),
+            _der(0xA0, signer.public_bytes(der)),
+            _der_set(signer_info),
+        )
+        message = _der_seq(_der_oid(OID_SIGNED_DATA), _der(0xA0, signed_data))
+        return message, transaction_id, sender_nonce, signer
+
+    def parse_certificate_response(
+        self, content, private_key, signer, transaction_id, sender_nonce
+    ):
+        """Verify a CertRep and return the issued certificate.
+
+        Raises SCEPPending while the request awaits approval and SCEPError
+        when the CA rejects it or the reply does not check out.
+        """
+        try:
+            content_info = _der_children(_der_read(content)[0][1])
+            signed_data = _der_children(_der_children(content_info[1][1])[0][1])
+            encapsulated = _der_children(signed_data[2][1])
+            signer_info = _der_children(_der_children(signed_data[-1][1])[0][1])
+            issuer, serial = _der_children(signer_info[1][1])
+            digest_oid = _der_children(signer_info[2][1])[0][2]
+            attributes = {}
+            for attribute in _der_children(signer_info[3][1]):
+                oid, values = _der_children(attribute[1])
+                attributes[oid[2]] = _der_children(values[1])[0][1]
+            signature = signer_info[5][1]
+        except (IndexError, ValueError):
+            raise SCEPError("Malformed CertRep message")
 
-        response = requests.post(
-            f"{self.scep_url}?operation=PKIOperation",
-            data=pkcs7_data,
-            headers={
-                "Content-Type": "application/x-pki-message",
-                "Content-Transfer-Encoding": "base64",
-            },
+        # Only the CA or RA certificates from GetCACert may sign the reply
+        serial_number = int.from_bytes(serial[1], "big", signed=True)
+        ra_cert = next(
+            (
+                cert
+                for cert in self.get_ca_certs()
+                if cert.serial_number == serial_number
+                and cert.issuer.public_bytes() == issuer[2]
+            ),
+            None,
         )
+        algorithm = next(
+            (
+                getattr(hashes, name.upper())()
+                for name, oid in DIGEST_OIDS.items()
+                if _der_oid(oid) == digest_oid
+            ),
+            None,
+        )
+        if ra_cert is None or algorithm is None:
+            raise SCEPError("CertRep not signed by the CA or RA certificate")
+        public_key = ra_cert.public_key()
+        try:
+            if isinstance(public_key, rsa.RSAPublicKey):
+                public_key.verify(
+                    signature,
+                    b"\x31" + signer_info[3][2][1:],
+                    padding.PKCS1v15(),
+                    algorithm,
+                )
+            else:
+                public_key.verify(
+                    signature, b"\x31" + signer_info[3][2][1:], ec.ECDSA(algorithm)
+                )
+        except InvalidSignature:
+            raise SCEPError("CertRep signature does not verify")
+
+        def attribute(oid):
+            return attributes.get(_der_oid(oid), b"")
+
+        if (
+            attribute(OID_MESSAGE_TYPE).decode() != MESSAGE_CERT_REP
+            or attribute(OID_TRANSACTION_ID).decode() != transaction_id
+            or attribute(OID_RECIPIENT_NONCE) != sender_nonce
+        ):
+            raise SCEPError("CertRep does not answer this request")
+
+        status = attribute(OID_PKI_STATUS).decode()
+        if status == STATUS_PENDING:
+            raise SCEPPending(transaction_id)
+        if status != STATUS_SUCCESS:
+            fail_info = attribute(OID_FAIL_INFO).decode()
+            raise SCEPRejected(FAIL_INFO.get(fail_info, fail_info))
+
+        try:
+            envelope = _der_octets(*_der_children(encapsulated[1][1])[0][:2])
+        except IndexError:
+            raise SCEPError("CertRep SUCCESS without a certificate")
+        digest = hashes.Hash(algorithm)
+        digest.update(envelope)
+        if attribute(OID_MESSAGE_DIGEST) != digest.finalize():
+            raise SCEPError("CertRep message digest does not match")
+
+        degenerate = pkcs7.pkcs7_decrypt_der(envelope, signer, private_key, [])
+        public_key = private_key.public_key().public_bytes(
+            serialization.Encoding.DER,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        for cert in pkcs7.load_der_pkcs7_certificates(degenerate):
+            if (
+                cert.public_key().public_bytes(
+                    serialization.Encoding.DER,
+                    serialization.PublicFormat.SubjectPublicKeyInfo,
+                )
+                == public_key
+            ):
+                return cert
+        raise SCEPError("CertRep holds no certificate for the request key")
+
+    def enroll_certificate(self, csr, private_key, poll=False):
+        """Submit a SCEP enrollment request, or poll one left PENDING"""
+        caps = self.get_ca_caps()
+
+        # Create PKCS#7 message
+        pkcs7_data, transaction_id, nonce, signer = self.create_pkcs7_request(
+            csr,
+            private_key,
+            self.hash_algorithm(),
+            MESSAGE_CERT_POLL if poll else MESSAGE_PKCS_REQ,
+        )
+
+        if "POSTPKIOPERATION" in caps or "SCEPSTANDARD" in caps:
+            # Raw DER body, no base64 expansion
+            response = self.session.post(
+                f"{self.scep_url}?operation=PKIOperation",
+                data=pkcs7_data,
+                headers={"Content-Type": "application/x-pki-message"},
+            )
+        else:
+            response = self.session.get(
+                self.scep_url,
+                params={
+                    "operation": "PKIOperation",
+                    "message": base64.b64encode(pkcs7_data).decode(),
+                },
+            )
 
         if response.status_code == 200:
-            return self.parse_certificate_response(response.content)
+            return self.parse_certificate_response(
+                response.content, private_key, signer, transaction_id, nonce
+            )
+        if response.status_code < 500:
+            raise SCEPError(f"Enrollment failed: {response.status_code}")
+        raise Exception(f"Enrollment failed: {response.status_code}")
+
+
+class FleetEnrollment:
+    """Concurrent SCEP enrollment for a device inventory with a resumable journal"""
+
+    def __init__(
+        self,
+        scep_url,
+        challenge_password,
+        journal_path,
+        output_dir,
+        concurrency=16,
+        max_attempts=5,
+        backoff=2,
+        pending_interval=60,
+        pending_timeout=3600,
+        key_size=2048,
+        key_type="rsa",
+        keygen_processes=0,
+        cache_dir=None,
+    ):
+        if key_type not in ENROLL_KEY_TYPES:
+            raise ValueError(f"SCEP enrollment does not support key type {key_type}")
+
+        self.journal_path = journal_path
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.pending_interval = pending_interval
+        self.pending_timeout = pending_timeout
+        self.key_size = key_size
+        self.key_type = key_type
+        self._journal_lock = threading.Lock()
+
+        # One keep-alive pool towards NDES shared by every worker
+        session = pki_transport.create_session("scep", pool_size=concurrency, hosts=1)
+        self.client = SCEPClient(
+            scep_url, challenge_password, session=session, cache_dir=cache_dir
+        )
+
+        # Keygen is CPU-bound; a process pool lets it use more than one core
+        self.keygen = KeygenPool(keygen_processes) if keygen_processes else self.client
+
+    def load_journal(self):
+        """Latest journal record per device"""
+        records = {}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record["common_name"]] = record
+        return records
+
+    def run(self, devices):
+        """Enroll every device not already issued in the journal"""
+        done = {
+            name
+            for name, record in self.load_journal().items()
+            if record["status"] == "issued"
+        }
+        pending = [d for d in devices if d["common_name"] not in done]
+        print(f"{len(done)} devices already enrolled, {len(pending)} to go")
+
+        if not pending:
+            return {"issued": 0, "failed": 0, "skipped": len(done)}
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        # Warm the GetCACert/GetCACaps cache once rather than once per device
+        self.client.get_ca_caps()
+
+        summary = {"issued": 0, "failed": 0, "skipped": len(done)}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(self.enroll_device, device): device
+                for device in pending
+            }
+            for future in as_completed(futures):
+                record = future.result()
+                summary[record["status"]] += 1
+                print(f"{record['common_name']}: {record['status']}")
+
+        return summary
+
+    def enroll_device(self, device):
+        """Generate a key and CSR, then enroll with retry and PENDING polling"""
+        common_name = device["common_name"]
+        key_size = device.get("key_size") or self.key_size
+        key_type = device.get("key_type") or self.key_type
+        try:
+            key_size = int(key_size)
+            private_key, csr = self.keygen.generate_csr(
+                common_name,
+                key_size=key_size,
+                key_type=key_type,
+                challenge_password=self.client.challenge,
+            )
+        except Exception as e:
+            # A bad inventory row fails this device, not the whole run
+            record = {
+                "common_name": common_name,
+                "attempts": 0,
+                "key_type": key_type,
+                "key_size": key_size,
+                "timestamp": datetime.now().isoformat(),
+                "status": "failed",
+                "error": f"Key generation failed: {str(e)}",
+            }
+            self._journal(record)
+            return record
+
+        attempts = 0
+        pending_since = None
+        error = None
+        fail_info = None
+
+        while True:
+            attempts += 1
+            try:
+                cert = self.client.enroll_certificate(
+                    csr, private_key, poll=pending_since is not None
+                )
+                error = None
+                break
+            except SCEPPending:
+                # Pending polls do not count against max_attempts
+                attempts -= 1
+                pending_since = pending_since or time.monotonic()
+                if time.monotonic() - pending_since >= self.pending_timeout:
+                    error = "Enrollment still pending after timeout"
+                    break
+                time.sleep(self.pending_interval)
+            except SCEPError as e:
+                # Rejected or unusable request: a retry would fail the same way
+                error = str(e)
+                fail_info = getattr(e, "fail_info", None)
+                break
+            except Exception as e:
+                error = str(e)
+                if attempts >= self.max_attempts:
+                    break
+                time.sleep(
+                    self.backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+                )
+
+        record = {
+            "common_name": common_name,
+            "attempts": attempts,
+            "key_type": key_type,
+            "key_size": key_size,
+            "timestamp": datetime.now().isoformat(),
+        }
+
+        if error is None:
+            key_path, cert_path = self._save(common_name, private_key, cert)
+            record.update(
+                status="issued",
+                serial=f"{cert.serial_number:X}",
+                not_before=cert.not_valid_before_utc.isoformat(),
+                not_after=cert.not_valid_after_utc.isoformat(),
+                key_path=key_path,
+                cert_path=cert_path,
+            )
         else:
-            raise Exception(f"Enrollment failed: {response.status_code}")
+            record.update(status="failed", error=error)
+            if fail_info:
+                record["fail_info"] = fail_info
+
+        self._journal(record)
+        return record
+
+    def _save(self, common_name, private_key, cert):
+        key_path = os.path.join(self.output_dir, f"{common_name}.key")
+        cert_path = os.path.join(self.output_dir, f"{common_name}.crt")
+
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(
+                private_key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption(),
+                )
+            )
+        with open(cert_path, "wb") as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+
+        return key_path, cert_path
+
+    def _journal(self, record):
+        # Append and fsync so an interrupted run resumes from the last device
+        with self._journal_lock:
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class RenewalScheduler:
+    """Re-enrolls journalled certificates part way through their lifetime.
+
+    Renewal sends a fresh PKCSReq with the --challenge given at startup, so
+    NDES must use a static challenge password (UseSinglePassword); a one-time
+    password is spent by the first request and the CA answers badRequest.
+    """
+
+    def __init__(
+        self,
+        fleet,
+        renew_percent=80,
+        jitter_percent=5,
+        max_per_minute=30,
+        retry_interval=3600,
+        idle_interval=60,
+    ):
+        self.fleet = fleet
+        self.renew_percent = renew_percent  # Matches "auto-enroll 80" on IOS
+        self.jitter_percent = jitter_percent
+        self.max_per_minute = max_per_minute
+        self.retry_interval = retry_interval
+        self.idle_interval = idle_interval  # Longest sleep between heap checks
+        self._heap = []  # (renew_at, common_name, record)
+        self._lock = threading.Lock()
+        self._rejected = None  # Set by the first badRequest; stops run()
+
+    def renew_at(self, record):
+        """Epoch time at which the certificate in record is due for renewal"""
+        not_before = datetime.fromisoformat(record["not_before"]).timestamp()
+        not_after = datetime.fromisoformat(record["not_after"]).timestamp()
+        # Seeded per device: spreads out a cohort issued together, and the
+        # offset stays the same across restarts
+        jitter = random.Random(record["common_name"]).uniform(0, self.jitter_percent)
+        percent = min(self.renew_percent + jitter, 100)
+        return not_before + (not_after - not_before) * percent / 100
+
+    def load(self):
+        """Schedule the last issued certificate of every journalled device"""
+        issued = {}
+        if os.path.exists(self.fleet.journal_path):
+            with open(self.fleet.journal_path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if record["status"] == "issued":
+                            issued[record["common_name"]] = record
+
+        with self._lock:
+            self._heap = [
+                (self.renew_at(record), name, record) for name, record in issued.items()
+            ]
+            heapq.heapify(self._heap)
+        return len(self._heap)
+
+    def run(self, stop=None):
+        """Renew certificates as they fall due until stop is set"""
+        stop = stop or threading.Event()
+        os.makedirs(self.fleet.output_dir, exist_ok=True)
+        slot_interval = 60 / self.max_per_minute
+        next_slot = 0
+
+        with ThreadPoolExecutor(max_workers=self.fleet.concurrency) as executor:
+            while not stop.is_set():
+                if self._rejected:
+                    raise SCEPError(self._rejected)
+
+                with self._lock:
+                    due = self._heap[0][0] if self._heap else None
+
+                delay = self.idle_interval if due is None else due - time.time()
+                if delay > 0:
+                    stop.wait(min(delay, self.idle_interval))
+                    continue
+
+                # Rate cap, so a backlog of overdue renewals drains steadily
+                wait = next_slot - time.monotonic()
+                if wait > 0:
+                    stop.wait(wait)
+                    continue
+                next_slot = time.monotonic() + slot_interval
+
+                with self._lock:
+                    _, name, record = heapq.heappop(self._heap)
+                executor.submit(self._renew, record)
+
+    def _renew(self, record):
+        device = {
+            "common_name": record["common_name"],
+            "key_size": record.get("key_size"),
+            "key_type": record.get("key_type"),
+        }
+        try:
+            # The CA certificates are cached per TTL, so CA rollovers are picked up
+            result = self.fleet.enroll_device(device)
+        except Exception as e:
+            result = {"status": "failed", "error": str(e)}
+
+        if result["status"] == "issued":
+            entry = (self.renew_at(result), result["common_name"], result)
+            print(f"{record['common_name']}: renewed")
+        elif result.get("fail_info") == "badRequest":
+            # Every later renewal would be refused the same way: most likely
+            # the challenge was a one-time password, so stop rather than retry
+            self._rejected = (
+                f"{record['common_name']}: CA rejected the renewal (badRequest); "
+                "renewal needs a static NDES challenge password"
+            )
+            return
+        else:
+            # Keep the current certificate scheduled and try again later
+            entry = (time.time() + self.retry_interval, record["common_name"], record)
+            print(f"{record['common_name']}: renewal failed: {result.get('error')}")
+
+        with self._lock:
+            heapq.heappush(self._heap, entry)
+
+
+def load_inventory(path):
+    """Device inventory CSV with a common_name column (key_size, key_type optional)"""
+    devices = []
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            if not row.get("common_name"):
+                continue
+            if (row.get("key_type") or "rsa") not in ENROLL_KEY_TYPES:
+                raise ValueError(
+                    f"{path} line {reader.line_num}: SCEP enrollment does not "
+                    f"support key type {row['key_type']}"
+                )
+            devices.append(row)
+    return devices
 
 
 # Cisco IOS Configuration
@@ -89,3 +1042,96 @@ crypto pki trustpoint COMPANY-SCEP
 crypto pki authenticate COMPANY-SCEP
 crypto pki enroll COMPANY-SCEP
 """
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fleet SCEP enrollment")
+    parser.add_argument("--scep-url")
+    parser.add_argument(
+        "--challenge", help="NDES challenge password; --renew needs a static one"
+    )
+    parser.add_argument("--inventory", help="CSV with common_name")
+    parser.add_argument("--journal", default="scep-enrollment-journal.ndjson")
+    parser.add_argument("--output-dir", default="enrolled")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--pending-interval", type=int, default=60)
+    parser.add_argument("--pending-timeout", type=int, default=3600)
+    parser.add_argument(
+        "--ca-cache-dir",
+        default="scep-cache",
+        help="GetCACert/GetCACaps cache directory",
+    )
+    parser.add_argument("--key-type", choices=ENROLL_KEY_TYPES, default="rsa")
+    parser.add_argument("--key-size", type=int, default=2048, help="RSA only")
+    parser.add_argument(
+        "--keygen-processes", type=int, default=0, help="0 generates keys inline"
+    )
+    parser.add_argument(
+        "--benchmark-keygen",
+        type=int,
+        metavar="COUNT",
+        help="compare key generation modes with COUNT keys each and exit",
+    )
+    parser.add_argument(
+        "--renew",
+        action="store_true",
+        help="run the renewal scheduler over the journal instead of enrolling",
+    )
+    parser.add_argument("--renew-percent", type=float, default=80)
+    parser.add_argument("--renew-jitter", type=float, default=5)
+    parser.add_argument("--renew-rate", type=float, default=30, help="per minute")
+    args = parser.parse_args()
+
+    timings = pki_transport.TimingStats()
+    pki_transport.add_timing_hook(timings)
+
+    if args.benchmark_keygen:
+        benchmark_keygen(args.benchmark_keygen, args.keygen_processes or None)
+        raise SystemExit(0)
+
+    if not (args.scep_url and args.challenge and (args.inventory or args.renew)):
+        parser.error("--scep-url, --challenge and --inventory are required")
+
+    fleet = FleetEnrollment(
+        args.scep_url,
+        args.challenge,
+        args.journal,
+        args.output_dir,
+        concurrency=args.concurrency,
+        max_attempts=args.max_attempts,
+        pending_interval=args.pending_interval,
+        pending_timeout=args.pending_timeout,
+        key_size=args.key_size,
+        key_type=args.key_type,
+        keygen_processes=args.keygen_processes,
+        cache_dir=args.ca_cache_dir,
+    )
+
+    if args.renew:
+        scheduler = RenewalScheduler(
+            fleet,
+            renew_percent=args.renew_percent,
+            jitter_percent=args.renew_jitter,
+            max_per_minute=args.renew_rate,
+        )
+        print(f"Scheduled {scheduler.load()} certificates for renewal")
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        except SCEPError as e:
+            raise SystemExit(f"Renewal stopped: {e}")
+        raise SystemExit(0)
+
+    try:
+        devices = load_inventory(args.inventory)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = fleet.run(devices)
+    print(
+        f"\nIssued {summary['issued']}, failed {summary['failed']}, "
+        f"already enrolled {summary['skipped']}"
+    )
+    print(json.dumps(timings.summary(), indent=2))
@@ -2,17 +2,82 @@
 # configure_netscaler_ssl.py
 # Configures SSL certificates on NetScaler ADC
 
-import requests
+import argparse
 import json
 import base64
-from datetime import datetime
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+import pki_transport
+
+# Desired sslvserver parameters
+SSL_PARAMETERS = {
+    "ssl3": "DISABLED",
+    "tls1": "DISABLED",
+    "tls11": "DISABLED",
+    "tls12": "ENABLED",
+    "tls13": "ENABLED",
+    "snienable": "ENABLED",
+    "sendclosenotify": "YES",
+    "cleartextport": 0,
+    "dh": "ENABLED",
+    "dhfile": "/nsconfig/ssl/dhparam2048.pem",
+    "ersa": "ENABLED",
+    "sessreuse": "ENABLED",
+    "sesstimeout": 120,
+    "cipherredirect": "DISABLED",
+    "sslredirect": "ENABLED",
+}
+
+CIPHER_GROUP = "SECURE_CIPHER_GROUP_2025"
+CIPHER_SUITES = [
+    "TLS1.3-AES256-GCM-SHA384",
+    "TLS1.3-AES128-GCM-SHA256",
+    "TLS1.2-ECDHE-RSA-AES256-GCM-SHA384",
+    "TLS1.2-ECDHE-RSA-AES128-GCM-SHA256",
+    "TLS1.2-ECDHE-ECDSA-AES256-GCM-SHA384",
+    "TLS1.2-ECDHE-ECDSA-AES128-GCM-SHA256",
+]
+
+
+# Order queued changes are applied in: files before the certkeys that
+# reference them, certkeys and cipher groups before their bindings
+BULK_ORDER = [
+    ("post", "systemfile", None),
+    ("post", "sslcipher", None),
+    ("post", "sslcipher_sslciphersuite_binding", None),
+    ("post", "sslcertkey", None),
+    ("post", "sslcertkey", "update"),
+    ("post", "sslvserver_sslcertkey_binding", None),
+    ("put", "sslvserver", None),
+    ("post", "sslvserver_sslcipher_binding", None),
+]
+
+# NITRO "resource already exists"; harmless when adding
+NITRO_EXISTS = 273
+
+
+def _serial(value):
+    # NITRO reports serials as hex, sometimes colon separated
+    try:
+        return int(str(value).replace(":", ""), 16)
+    except ValueError:
+        return None
 
 
 class NetScalerSSLConfig:
-    def __init__(self, nsip, username, password):
+    def __init__(self, nsip, username, password, pool_size=4):
         self.nsip = nsip
         self.base_url = f"https://{nsip}/nitro/v1/config"
-        self.session = requests.Session()
+        self.session = pki_transport.create_session(
+            "nitro", pool_size=pool_size, hosts=1, verify=False
+        )
         self.session.headers.update(
             {
                 "Content-Type": "application/json",
@@ -20,7 +85,6 @@ class NetScalerSSLConfig:
                 "X-NITRO-PASS": password,
             }
         )
-        self.session.verify = False
 
     def upload_certificate(self, cert_name, cert_content, key_content):
         """Upload certificate and key to NetScaler"""
@@ -100,26 +164,7 @@ class NetScalerSSLConfig:
     def configure_ssl_parameters(self, vserver_name):
         """Configure SSL parameters for security"""
 
-        ssl_params = {
-            "sslvserver": {
-                "vservername": vserver_name,
-                "ssl3": "DISABLED",
-                "tls1": "DISABLED",
-                "tls11": "DISABLED",
-                "tls12": "ENABLED",
-                "tls13": "ENABLED",
-                "snienable": "ENABLED",
-                "sendclosenotify": "YES",
-                "cleartextport": 0,
-                "dh": "ENABLED",
-                "dhfile": "/nsconfig/ssl/dhparam2048.pem",
-                "ersa": "ENABLED",
-                "sessreuse": "ENABLED",
-                "sesstimeout": 120,
-                "cipherredirect": "DISABLED",
-                "sslredirect": "ENABLED",
-            }
-        }
+        ssl_params = {"sslvserver": {"vservername": vserver_name, **SSL_PARAMETERS}}
 
         response = self.session.put(
             f"{self.base_url}/sslvserver/{vserver_name}", json=ssl_params
@@ -136,15 +181,8 @@ class NetScalerSSLConfig:
         # Create custom cipher group
         cipher_group = {
             "sslcipher": {
-                "ciphergroupname": "SECURE_CIPHER_GROUP_2025",
-                "ciphernamesuite": [
-                    "TLS1.3-AES256-GCM-SHA384",
-                    "TLS1.3-AES128-GCM-SHA256",
-                    "TLS1.2-ECDHE-RSA-AES256-GCM-SHA384",
-                    "TLS1.2-ECDHE-RSA-AES128-GCM-SHA256",
-                    "TLS1.2-ECDHE-ECDSA-AES256-GCM-SHA384",
-                    "TLS1.2-ECDHE-ECDSA-AES128-GCM-SHA256",
-                ],
+                "ciphergroupname": CIPHER_GROUP,
+                "ciphernamesuite": CIPHER_SUITES,
             }
         }
 
@@ -152,7 +190,7 @@ class NetScalerSSLConfig:
         binding_data = {
             "sslvserver_sslcipher_binding": {
                 "vservername": vserver_name,
-                "ciphername": "SECURE_CIPHER_GROUP_2025",
+                "ciphername": CIPHER_GROUP,
             }
         }
 
@@ -162,14 +200,554 @@ class NetScalerSSLConfig:
 
         print(f"Cipher suites configured for {vserver_name}")
 
+    def get_all(self, resource, name=None, **args):
+        """All objects of a NITRO resource type in one GET (empty if none)"""
+        url = f"{self.base_url}/{resource}" + (f"/{name}" if name else "")
+        params = (
+            {"args": ",".join(f"{k}:{v}" for k, v in args.items())} if args else None
+        )
+        if resource.endswith("_binding") and not name:
+            params = {**(params or {}), "bulkbindings": "yes"}
+
+        response = self.session.get(url, params=params)
+
+        if response.status_code == 404:
+            return []
+        if response.status_code != 200:
+            raise Exception(f"Failed to read {resource}: {response.text}")
+        return response.json().get(resource, [])
+
+    def read_state(self):
+        """Current SSL configuration, one bulk GET per resource type"""
+        return {
+            "certkeys": {c["certkey"]: c for c in self.get_all("sslcertkey")},
+            "vservers": {v["vservername"]: v for v in self.get_all("sslvserver")},
+            "cert_bindings": {
+                (b["vservername"], b["certkeyname"])
+                for b in self.get_all("sslvserver_sslcertkey_binding")
+                if b.get("certkeyname")
+            },
+            "cipher_bindings": {
+                (b["vservername"], b["ciphername"])
+                for b in self.get_all("sslvserver_sslcipher_binding")
+                if b.get("ciphername")
+            },
+            "cipher_suites": {
+                b["ciphername"]
+                for b in self.get_all("sslcipher_sslciphersuite_binding", CIPHER_GROUP)
+            },
+        }
+
+    def bulk(self, method, resource, objects, action=None):
+        """Add or update many objects in one NITRO request.
+
+        Returns one entry per object: None on success, else the error message.
+        """
+        url = f"{self.base_url}/{resource}" + (f"?action={action}" if action else "")
+        response = getattr(self.session, method)(
+            url, json={resource: objects}, headers={"X-NITRO-ONERROR": "continue"}
+        )
+
+        if response.status_code in [200, 201]:
+            return [None] * len(objects)
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+
+        # 207 Multi-Status carries a result per object
+        results = body.get("response")
+        if isinstance(results, list) and len(results) == len(objects):
+            return [
+                (
+                    None
+                    if r.get("errorcode", 0) in [0, NITRO_EXISTS]
+                    else r.get("message", "failed")
+                )
+                for r in results
+            ]
+        return [body.get("message") or response.text] * len(objects)
+
+    def sync_cipher_group(self, state, batch=None):
+        """Create the cipher group and add any missing suites"""
+        actions = []
+        queue = NitroBatch(self) if batch is None else batch
+
+        if not state["cipher_suites"]:
+            queue.add(
+                "post", "sslcipher", {"ciphergroupname": CIPHER_GROUP}, CIPHER_GROUP
+            )
+            actions.append("create cipher group")
+
+        for suite in CIPHER_SUITES:
+            if suite in state["cipher_suites"]:
+                continue
+            queue.add(
+                "post",
+                "sslcipher_sslciphersuite_binding",
+                {"ciphergroupname": CIPHER_GROUP, "ciphername": suite},
+                CIPHER_GROUP,
+            )
+            state["cipher_suites"].add(suite)
+            actions.append(f"add {suite}")
+
+        if batch is None:
+            queue.raise_errors()
+        return actions
+
+    def sync_vserver(
+        self, state, vserver_name, cert_name, cert_content, load_key, batch=None
+    ):
+        """Apply only the changes needed to match the desired state.
+
+        load_key is called only when the certificate has to be uploaded.
+        Changes are queued on batch when given (the caller flushes it),
+        otherwise applied before returning. Returns the list of changes,
+        empty when already in sync.
+        """
+        actions = []
+        queue = NitroBatch(self) if batch is None else batch
+
+        # sslcertkey exposes the serial rather than a digest; within one CA
+        # hierarchy the serial identifies the certificate
+        serial = x509.load_pem_x509_certificate(cert_content.encode()).serial_number
+        current = state["certkeys"].get(cert_name)
+
+        if current is None or _serial(current.get("serial")) != serial:
+            # Serial-suffixed files, so a replacement never clashes with the
+            # files the live certkey still references
+            file_name = f"{cert_name}_{serial:x}"
+            for extension, content in [("crt", cert_content), ("key", load_key())]:
+                queue.add(
+                    "post",
+                    "systemfile",
+                    {
+                        "filename": f"{file_name}.{extension}",
+                        "filecontent": base64.b64encode(content.encode()).decode(),
+                        "filelocation": "/nsconfig/ssl/",
+                        "fileencoding": "BASE64",
+                    },
+                    vserver_name,
+                )
+
+            certkey = {
+                "certkey": cert_name,
+                "cert": f"/nsconfig/ssl/{file_name}.crt",
+                "key": f"/nsconfig/ssl/{file_name}.key",
+            }
+            if current is None:
+                queue.add(
+                    "post", "sslcertkey", {**certkey, "inform": "PEM"}, vserver_name
+                )
+                actions.append("create certkey")
+            else:
+                queue.add(
+                    "post",
+                    "sslcertkey",
+                    {**certkey, "nodomaincheck": True},
+                    vserver_name,
+                    action="update",
+                )
+                actions.append("replace certificate")
+            state["certkeys"][cert_name] = {
+                "certkey": cert_name,
+                "serial": f"{serial:x}",
+            }
+
+        if (vserver_name, cert_name) not in state["cert_bindings"]:
+            queue.add(
+                "post",
+                "sslvserver_sslcertkey_binding",
+                {
+                    "vservername": vserver_name,
+                    "certkeyname": cert_name,
+                    "snicert": True,
+                },
+                vserver_name,
+            )
+            state["cert_bindings"].add((vserver_name, cert_name))
+            actions.append("bind certificate")
+
+        live = state["vservers"].setdefault(vserver_name, {})
+        changed = {
+            key: value
+            for key, value in SSL_PARAMETERS.items()
+            if str(live.get(key)) != str(value)
+        }
+        if changed:
+            queue.add(
+                "put",
+                "sslvserver",
+                {"vservername": vserver_name, **changed},
+                vserver_name,
+            )
+            live.update(changed)
+            actions.append(f"set {', '.join(sorted(changed))}")
+
+        if (vserver_name, CIPHER_GROUP) not in state["cipher_bindings"]:
+            queue.add(
+                "post",
+                "sslvserver_sslcipher_binding",
+                {"vservername": vserver_name, "ciphername": CIPHER_GROUP},
+                vserver_name,
+            )
+            state["cipher_bindings"].add((vserver_name, CIPHER_GROUP))
+            actions.append("bind cipher group")
+
+        if batch is None:
+            queue.raise_errors()
+        return actions
+
+
+class NitroBatch:
+    """NITRO changes queued per resource and applied as bulk requests"""
+
+    def __init__(self, config, bulk_size=100):
+        self.config = config
+        self.bulk_size = bulk_size
+        self._queued = {key: [] for key in BULK_ORDER}
+
+    def add(self, method, resource, obj, owner, action=None):
+        """Queue obj; owner (usually the vserver) is who its errors belong to"""
+        self._queued[(method, resource, action)].append((owner, obj))
+
+    def __len__(self):
+        return sum(len(items) for items in self._queued.values())
+
+    def flush(self):
+        """Send every queued change, returning {owner: [error, ...]}"""
+        errors = {}
+        for (method, resource, action), items in self._queued.items():
+            for start in range(0, len(items), self.bulk_size):
+                chunk = items[start : start + self.bulk_size]
+                results = self.config.bulk(
+                    method, resource, [obj for _, obj in chunk], action
+                )
+                for (owner, _), error in zip(chunk, results):
+                    if error:
+                        errors.setdefault(owner, []).append(f"{resource}: {error}")
+            items.clear()
+        return errors
+
+    def raise_errors(self):
+        errors = self.flush()
+        if errors:
+            raise Exception(
+                "; ".join(e for owner_errors in errors.values() for e in owner_errors)
+            )
+
+
+class PKIClient:
+    """Certificates and keys for vserver hostnames from the PKI API service.
+
+    The service does not keep private keys, so the key and serial from the
+    first issuance are stored locally. Later runs re-read the certificate by
+    serial and only re-issue it once revoked, missing or close to expiry.
+    A new serial only becomes readable once the CA database sync records it,
+    so it is polled for up to issue_timeout seconds before giving up.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        token,
+        store_dir="pki-store",
+        template="WebServer",
+        renew_days=30,
+        pool_size=16,
+        issue_timeout=300,
+        poll_interval=2,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.store_dir = store_dir
+        self.template = template
+        self.renew_days = renew_days
+        self.issue_timeout = issue_timeout
+        self.poll_interval = poll_interval  # doubled per poll, up to 30 seconds
+        self.session = pki_transport.create_session("pki-api", pool_size=pool_size)
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+        self._current = {}  # hostname -> (cert PEM, key path)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def get_certificate(self, hostname):
+        """PEM certificate for hostname"""
+        return self._get(hostname)[0]
+
+    def get_private_key(self, hostname):
+        """PEM private key matching get_certificate(hostname)"""
+        with open(self._get(hostname)[1]) as f:
+            return f.read()
+
+    def _get(self, hostname):
+        # One lookup per hostname per run, shared by every vserver and
+        # appliance that serves it
+        with self._locks_lock:
+            lock = self._locks.setdefault(hostname, threading.Lock())
+        with lock:
+            if hostname not in self._current:
+                self._current[hostname] = self._load(hostname)
+            return self._current[hostname]
+
+    def _load(self, hostname):
+        record_path = os.path.join(self.store_dir, f"{hostname}.json")
+        key_path = os.path.join(self.store_dir, f"{hostname}.key")
+
+        if os.path.exists(record_path) and os.path.exists(key_path):
+            with open(record_path) as f:
+                record = json.load(f)
+            # A serial issued by a recent run may not be synced yet
+            cert = self._wait_for(
+                record["serial"], datetime.fromisoformat(record["issued"])
+            )
+            renew_after = datetime.now() + timedelta(days=self.renew_days)
+            if cert and cert["status"] == "Issued" and cert["expiry"] > renew_after:
+                return cert["pem"], key_path
+
+        return self._issue(hostname, record_path, key_path), key_path
+
+    def _fetch(self, serial):
+        response = self.session.get(f"{self.base_url}/api/certificate/{serial}")
+
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise Exception(f"Failed to retrieve certificate {serial}: {response.text}")
+
+        body = response.json()
+        cert = x509.load_der_x509_certificate(base64.b64decode(body["certificate"]))
+        return {
+            "pem": cert.public_bytes(serialization.Encoding.PEM).decode(),
+            "status": body["status"],
+            "expiry": datetime.fromisoformat(body["expiry"]),
+        }
+
+    def _issue(self, hostname, record_path, key_path):
+        response = self.session.post(
+            f"{self.base_url}/api/certificate/request",
+            json={
+                "template": self.template,
+                "subject": f"CN={hostname}",
+                "san": [hostname],
+                "async": False,
+            },
+        )
+
+        if response.status_code != 201:
+            raise Exception(
+                f"Failed to issue certificate for {hostname}: {response.text}"
+            )
+
+        body = response.json()
+        os.makedirs(self.store_dir, exist_ok=True)
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(body["private_key"])
+        with open(record_path, "w") as f:
+            json.dump(
+                {"serial": body["serial"], "issued": datetime.now().isoformat()}, f
+            )
+
+        cert = self._wait_for(body["serial"], datetime.now())
+        if cert is None:
+            raise Exception(
+                f"Issued certificate {body['serial']} not readable after "
+                f"{self.issue_timeout}s"
+            )
+        return cert["pem"]
+
+    def _wait_for(self, serial, issued):
+        # Not found is pending until issue_timeout after issuance, then missing
+        deadline = issued + timedelta(seconds=self.issue_timeout)
+        interval = self.poll_interval
+        while True:
+            cert = self._fetch(serial)
+            if cert is not None or datetime.now() >= deadline:
+                return cert
+            time.sleep(
+                max(0, min(interval, (deadline - datetime.now()).total_seconds()))
+            )
+            interval = min(interval * 2, 30)
+
+
+# Set in __main__
+pki_client = None
+
+
+def get_certificate_from_pki(hostname):
+    """Retrieve the certificate for hostname from the PKI API service"""
+    return pki_client.get_certificate(hostname)
+
+
+def get_private_key_from_pki(hostname):
+    """Retrieve the private key for hostname's certificate"""
+    return pki_client.get_private_key(hostname)
+
+
+def pipeline(items, fetch, workers=4, depth=16):
+    """Yield (item, result, error) in order while fetch runs ahead.
+
+    At most depth fetches are outstanding or waiting to be consumed, so a
+    slow consumer bounds memory rather than the producer running away.
+    """
+    items = iter(items)
+    window = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for item in items:
+            window.append((item, executor.submit(fetch, item)))
+            if len(window) >= depth:
+                break
+
+        while window:
+            item, future = window.popleft()
+            following = next(items, None)
+            if following is not None:
+                window.append((following, executor.submit(fetch, following)))
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+
+def sync_appliance(nsip, username, password, vservers, fetch_certificate, fetch_key):
+    """Bring one appliance in sync with bulk requests and report per vserver"""
+    started = time.monotonic()
+    report = {"nsip": nsip, "status": "ok", "error": None, "vservers": {}}
+
+    try:
+        ns = NetScalerSSLConfig(nsip, username, password)
+        state = ns.read_state()
+        batch = NitroBatch(ns)
+        report["cipher_group"] = ns.sync_cipher_group(state, batch)
+
+        # PKI fetches for later vservers overlap the diffing of earlier ones
+        for vserver, cert_content, error in pipeline(
+            vservers, lambda v: fetch_certificate(v["hostname"])
+        ):
+            try:
+                if error:
+                    raise error
+                actions = ns.sync_vserver(
+                    state,
+                    vserver["name"],
+                    vserver["cert_name"],
+                    cert_content,
+                    lambda: fetch_key(vserver["hostname"]),
+                    batch,
+                )
+                report["vservers"][vserver["name"]] = {
+                    "status": "changed" if actions else "in sync",
+                    "actions": actions,
+                }
+            except Exception as e:
+                report["vservers"][vserver["name"]] = {
+                    "status": "failed",
+                    "error": str(e),
+                }
+
+        requests_before = len(batch)
+        for owner, errors in batch.flush().items():
+            if owner == CIPHER_GROUP:
+                report["error"] = "; ".join(errors)
+            else:
+                report["vservers"][owner].update(
+                    status="failed", error="; ".join(errors)
+                )
+        report["changes"] = requests_before
+
+        if report["error"] or any(
+            v["status"] == "failed" for v in report["vservers"].values()
+        ):
+            report["status"] = "partial"
+    except Exception as e:
+        report.update(status="failed", error=str(e))
+
+    report["seconds"] = round(time.monotonic() - started, 2)
+    return report
+
+
+def run_fleet(
+    appliances, username, password, fetch_certificate, fetch_key, concurrency=8
+):
+    """Sync many appliances in parallel and aggregate their reports"""
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        reports = list(
+            executor.map(
+                lambda appliance: sync_appliance(
+                    appliance["nsip"],
+                    username,
+                    password,
+                    appliance["vservers"],
+                    fetch_certificate,
+                    fetch_key,
+                ),
+                appliances,
+            )
+        )
+
+    summary = {"appliances": len(reports)}
+    for report in reports:
+        key = f"appliances_{report['status']}"
+        summary[key] = summary.get(key, 0) + 1
+        for vserver in report["vservers"].values():
+            key = f"vservers_{vserver['status'].replace(' ', '_')}"
+            summary[key] = summary.get(key, 0) + 1
+
+    return {"summary": summary, "appliances": reports}
+
 
 # Main configuration
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Configure NetScaler SSL")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="read current state first and change only what differs",
+    )
+    parser.add_argument(
+        "--fleet",
+        help='JSON list of {"nsip": ..., "vservers": [...]} to sync in parallel',
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--report", help="write the fleet report to this file")
+    parser.add_argument("--pki-url", default="https://pki-api.company.com.au")
+    parser.add_argument("--pki-store", default="pki-store")
+    args = parser.parse_args()
+
+    timings = pki_transport.TimingStats()
+    pki_transport.add_timing_hook(timings)
+
+    pki_client = PKIClient(
+        args.pki_url, os.environ.get("PKI_API_TOKEN", ""), store_dir=args.pki_store
+    )
+
     # NetScaler details
     NS_IP = "10.20.1.10"
     NS_USER = "nsadmin"
     NS_PASS = "nspassword"
 
+    if args.fleet:
+        with open(args.fleet) as f:
+            appliances = json.load(f)
+
+        fleet_report = run_fleet(
+            appliances,
+            NS_USER,
+            NS_PASS,
+            get_certificate_from_pki,
+            get_private_key_from_pki,
+            concurrency=args.concurrency,
+        )
+        fleet_report["http"] = timings.summary()
+        print(json.dumps(fleet_report["summary"], indent=2))
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(fleet_report, f, indent=2)
+        summary = fleet_report["summary"]
+        raise SystemExit(0 if summary.get("appliances_ok") == len(appliances) else 1)
+
     # Initialize NetScaler configuration
     ns = NetScalerSSLConfig(NS_IP, NS_USER, NS_PASS)
 
@@ -192,13 +770,34 @@ if __name__ == "__main__":
         },
     ]
 
-    for vserver in vservers:
+    if args.sync:
+        report = sync_appliance(
+            NS_IP,
+            NS_USER,
+            NS_PASS,
+            vservers,
+            get_certificate_from_pki,
+            get_private_key_from_pki,
+        )
+        for name, result in report["vservers"].items():
+            outcome = result.get("error") or "; ".join(result["actions"])
+            print(f"{name}: {outcome or 'in sync'}")
+        raise SystemExit(0 if report["status"] == "ok" else 1)
+
+    # Certificates for later vservers are fetched while earlier ones upload
+    for vserver, fetched, error in pipeline(
+        vservers,
+        lambda v: (
+            get_certificate_from_pki(v["hostname"]),
+            get_private_key_from_pki(v["hostname"]),
+        ),
+    ):
         print(f"\nConfiguring {vserver['name']}...")
 
-        # Get certificate from PKI
-        # This would retrieve cert from CA or Key Vault
-        cert_content = get_certificate_from_pki(vserver["hostname"])
-        key_content = get_private_key_from_pki(vserver["hostname"])
+        if error:
+            print(f"Failed to retrieve certificate: {error}")
+            continue
+        cert_content, key_content = fetched
 
         # Upload certificate
         ns.upload_certificate(vserver["cert_name"], cert_content, key_content)
@@ -220,3 +819,4 @@ if __name__ == "__main__":
         ns.configure_cipher_suites(vserver["name"])
 
     print("\nNetScaler SSL configuration complete!")
+    print(json.dumps(timings.summary(), indent=2))
@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# pki_api_benchmark.py
+# Load-test harness for pki-api-service.py using local stand-ins for the
+# CA web enrollment endpoint, the PKI_Management database and certutil
+
+import argparse
+import importlib.util
+import itertools
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from werkzeug.serving import make_server
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ENDPOINTS = ["request", "retrieve", "status", "validate", "revoke", "expiring"]
+
+
+# Stand-in for pyodbc backed by SQLite
+def sqlite_pyodbc(db_path):
+    """Module object exposing the subset of pyodbc the service uses"""
+
+    class Error(Exception):
+        pass
+
+    class Cursor:
+        def __init__(self, conn):
+            self._cursor = conn.cursor()
+            self.fast_executemany = False
+
+        def execute(self, sql, *params):
+            sql, params = self._translate(sql, params)
+            try:
+                self._cursor.execute(sql, params)
+            except sqlite3.Error as e:
+                raise Error(str(e))
+            return self
+
+        def executemany(self, sql, rows):
+            try:
+                self._cursor.executemany(sql, rows)
+            except sqlite3.Error as e:
+                raise Error(str(e))
+            return self
+
+        def fetchone(self):
+            return self._cursor.fetchone()
+
+        def fetchall(self):
+            return self._cursor.fetchall()
+
+        def fetchmany(self, size):
+            return self._cursor.fetchmany(size)
+
+        def close(self):
+            self._cursor.close()
+
+        @staticmethod
+        def _translate(sql, params):
+            # SQL Server TOP (?) becomes a trailing LIMIT ?
+            if "TOP (?)" in sql:
+                sql = sql.replace("TOP (?) ", "") + " LIMIT ?"
+                params = params[1:] + params[:1]
+            return sql, params
+
+    class Connection:
+        def __init__(self):
+            self._conn = sqlite3.connect(
+                db_path,
+                timeout=30,
+                check_same_thread=False,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+            )
+
+        def cursor(self):
+            return Cursor(self._conn)
+
+        def commit(self):
+            self._conn.commit()
+
+        def rollback(self):
+            self._conn.rollback()
+
+        def close(self):
+            self._conn.close()
+
+    module = types.ModuleType("pyodbc")
+    module.Error = Error
+    module.connect = lambda conn_str, **kwargs: Connection()
+    return module
+
+
+def create_database(db_path, certificates):
+    """Create the service tables and seed the Certificates table"""
+    db = sqlite3.connect(db_path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript("""
+        CREATE TABLE CertificateRequests (
+            RequestDate timestamp, Template TEXT, Subject TEXT, SAN TEXT,
+            Serial TEXT, Requester TEXT, Status TEXT
+        );
+        CREATE TABLE Certificates (
+            Serial TEXT PRIMARY KEY, Certificate BLOB, IssuedDate timestamp,
+            ExpiryDate timestamp, Status TEXT, RevokedDate timestamp,
+            RevokedReason TEXT
+        );
+        CREATE INDEX IX_Certificates_Expiry ON Certificates (ExpiryDate, Serial);
+        """)
+    db.executemany(
+        "INSERT INTO Certificates VALUES (?, ?, ?, ?, ?, NULL, NULL)",
+        certificates,
+    )
+    db.commit()
+    db.close()
+
+
+# Stand-in for certsrv/certfnsh.asp
+def start_fake_ca(latency):
+    serials = itertools.count(0x10000000)
+    serial_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            with serial_lock:
+                serial = next(serials)
+            body = (
+                "<html><body><p>Certificate Issued</p>"
+                f"<p>Serial Number: {serial:X}</p></body></html>"
+            ).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/certsrv/certfnsh.asp"
+
+
+# Stand-in for certutil
+def install_fake_certutil(directory, latency):
+    path = os.path.join(directory, "certutil")
+    with open(path, "w") as f:
+        f.write(f"#!/bin/sh\nsleep {latency}\nexit 0\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    os.environ["PATH"] = directory + os.pathsep + os.environ["PATH"]
+
+
+def build_test_pki(count):
+    """Root + issuing CA chain and count leaf certificates"""
+    now = datetime.now(timezone.utc)
+
+    def issue(common_name, issuer_name, issuer_key, ca, days):
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(issuer_name or name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1))
+            .not_valid_after(now + timedelta(days=days))
+            .add_extension(
+                x509.BasicConstraints(ca=ca, path_length=None), critical=True
+            )
+            .sign(issuer_key or key, hashes.SHA256())
+        )
+        return key, cert
+
+    root_key, root = issue("Benchmark Root CA", None, None, True, 3650)
+    issuing_key, issuing = issue(
+        "Benchmark Issuing CA", root.subject, root_key, True, 1825
+    )
+    leaves = [
+        issue(f"host{i}.bench.local", issuing.subject, issuing_key, False, 5 + i % 365)[
+            1
+        ]
+        for i in range(count)
+    ]
+    return [issuing, root], leaves
+
+
+def load_service(db_path, ca_url, ca_chain_path, spill_path):
+    sys.modules["pyodbc"] = sqlite_pyodbc(db_path)
+    # The service imports pki_transport from its own directory
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+
+    spec = importlib.util.spec_from_file_location(
+        "pki_api_service", os.path.join(SCRIPT_DIR, "pki-api-service.py")
+    )
+    service = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(service)
+
+    service.ca_client.urls = [ca_url]
+    service.trust_store.path = ca_chain_path
+    service.audit_writer.spill_path = spill_path
+
+    # Same warm-up as the service's own __main__ block
+    service.db_pool.prefill()
+    service.key_pool.start()
+    service.audit_writer.start()
+    service.trust_store.load()
+    service.revocation_index.start()
+    service.expiry_index.start()
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and any(
+        available < service.key_pool.size
+        for available in service.key_pool.stats()["available"].values()
+    ):
+        time.sleep(0.5)
+
+    return service
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_endpoint(name, make_request, total, concurrency):
+    """Fire total requests at the given concurrency and summarise latency"""
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def worker():
+        nonlocal errors
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            start = time.perf_counter()
+            try:
+                ok = make_request(local.session, i)
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "endpoint": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_second": round(total / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+def compare(results, baseline_path):
+    """Print p95 and throughput deltas against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {r["endpoint"]: r for r in json.load(f)["results"]}
+
+    print("\nChange vs baseline:")
+    for result in results:
+        previous = baseline.get(result["endpoint"])
+        if not previous:
+            continue
+        p95 = (result["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+        rps = (
+            (result["requests_per_second"] - previous["requests_per_second"])
+            / previous["requests_per_second"]
+            * 100
+        )
+        print(f"  {result['endpoint']:<10} p95 {p95:+.1f}%  req/s {rps:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pki-api-service.py")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--requests", type=int, default=500, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="per endpoint")
+    parser.add_argument("--certificates", type=int, default=1000, help="seeded rows")
+    parser.add_argument("--ca-latency", type=float, default=50, help="milliseconds")
+    parser.add_argument("--certutil-latency", type=float, default=20, help="ms")
+    parser.add_argument("--output", default="pki-api-benchmark.json")
+    parser.add_argument("--baseline", help="previous results file to compare with")
+    parser.add_argument(
+        "--keep-workdir", action="store_true", help="keep the stand-in database etc."
+    )
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pki-bench-")
+    print(f"Working directory: {workdir}")
+
+    # Stand-ins
+    chain, leaves = build_test_pki(args.certificates)
+    ca_chain_path = os.path.join(workdir, "ca-chain.pem")
+    with open(ca_chain_path, "wb") as f:
+        for cert in chain:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+
+    db_path = os.path.join(workdir, "pki.db")
+    create_database(
+        db_path,
+        [
+            (
+                f"{leaf.serial_number:X}",
+                leaf.public_bytes(serialization.Encoding.DER),
+                leaf.not_valid_before_utc.replace(tzinfo=None),
+                leaf.not_valid_after_utc.replace(tzinfo=None),
+                "Issued",
+            )
+            for leaf in leaves
+        ],
+    )
+
+    ca_server, ca_url = start_fake_ca(args.ca_latency / 1000)
+    install_fake_certutil(workdir, args.certutil_latency / 1000)
+
+    service = load_service(
+        db_path, ca_url, ca_chain_path, os.path.join(workdir, "audit-spill.ndjson")
+    )
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, service.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    with service.app.app_context():
+        token = service.create_access_token(identity="benchmark")
+    headers = {"Authorization": f"Bearer {token}", "X-User": "benchmark"}
+
+    serials = [f"{leaf.serial_number:X}" for leaf in leaves]
+    pems = [leaf.public_bytes(serialization.Encoding.PEM).decode() for leaf in leaves]
+
+    def ok(response, expected=(200, 201)):
+        response.content  # drain streamed bodies
+        return response.status_code in expected
+
+    scenarios = {
+        "request": lambda session, i: ok(
+            session.post(
+                f"{base_url}/api/certificate/request",
+                json={
+                    "template": "WebServer",
+                    "subject": f"/O=Company/CN=bench{i}.bench.local",
+                    "san": f"bench{i}.bench.local",
+                },
+                headers=headers,
+            )
+        ),
+        "retrieve": lambda session, i: ok(
+            session.get(
+                f"{base_url}/api/certificate/{serials[i % len(serials)]}",
+                headers=headers,
+            )
+        ),
+        "status": lambda session, i: ok(
+            session.get(
+                f"{base_url}/api/certificate/{serials[i % len(serials)]}/status"
+            )
+        ),
+        "validate": lambda session, i: ok(
+            session.post(
+                f"{base_url}/api/certificate/validate",
+                json={"certificate": pems[i % len(pems)]},
+            )
+        ),
+        "revoke": lambda session, i: ok(
+            session.post(
+                f"{base_url}/api/certificate/{serials[i % len(serials)]}/revoke",
+                json={"reason": "superseded"},
+                headers=headers,
+            )
+        ),
+        "expiring": lambda session, i: ok(
+            session.get(
+                f"{base_url}/api/certificate/expiring",
+                params={"days": 30},
+                headers=headers,
+            )
+        ),
+    }
+
+    results = []
+    for name in args.endpoints:
+        if args.warmup:
+            run_endpoint(name, scenarios[name], args.warmup, args.concurrency)
+        result = run_endpoint(name, scenarios[name], args.requests, args.concurrency)
+        results.append(result)
+        print(
+            f"{name:<10} {result['requests_per_second']:>8} req/s  "
+            f"p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms  "
+            f"p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+        )
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "certificates": args.certificates,
+            "ca_latency_ms": args.ca_latency,
+            "certutil_latency_ms": args.certutil_latency,
+            "python": sys.version.split()[0],
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+    server.shutdown()
+    ca_server.shutdown()
+
+    if not args.keep_workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,58 @@
 # pki_api_service.py
 # REST API for PKI certificate services
 
-from flask import Flask, request, jsonify
+from flask import (
+    Flask,
+    Response,
+    g,
+    has_request_context,
+    request,
+    jsonify,
+    stream_with_context,
+)
 from flask_restful import Api, Resource
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token
+from flask_jwt_extended import (
+    JWTManager,
+    jwt_required,
+    create_access_token,
+    get_jwt_identity,
+)
 import requests
 import base64
 import subprocess
 import logging
-from datetime import datetime, timedelta
+import atexit
+import bisect
+import hashlib
+import json
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 import pyodbc
+from urllib3.exceptions import NewConnectionError
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.x509.verification import (
+    Criticality,
+    ExtensionPolicy,
+    PolicyBuilder,
+    Store,
+    VerificationError,
+)
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+import pki_transport
 
 app = Flask(__name__)
 api = Api(app)
@@ -19,9 +62,984 @@ app.config["JWT_SECRET_KEY"] = "your-secret-key"
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)
 jwt = JWTManager(app)
 
+# Metrics
+app.config["SLOW_REQUEST_THRESHOLD"] = 2.0  # seconds; slower requests log their phases
+app.config["SLOW_REQUEST_SAMPLE_RATE"] = 1.0  # fraction of slow requests logged
+
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Metrics:
+    """Histograms and gauges rendered in Prometheus text format"""
+
+    def __init__(self, buckets=METRIC_BUCKETS):
+        self.buckets = buckets
+        self._types = {}  # name -> (type, help)
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._values = {}  # (name, labels) -> gauge or counter value
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text):
+        self._types[name] = (kind, help_text)
+
+    def observe(self, name, value, **labels):
+        """Record a histogram observation"""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def add(self, name, amount, **labels):
+        """Adjust a gauge or counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        with self._lock:
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+            values = dict(self._values)
+
+        lines = []
+        for name, (kind, help_text) in sorted(self._types.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            if kind == "histogram":
+                for (metric, labels), histogram in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket"
+                            f"{self._labels(labels, le=str(bound))} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_bucket{self._labels(labels, le='+Inf')} "
+                        f"{histogram[-1]}"
+                    )
+                    lines.append(f"{name}_sum{self._labels(labels)} {histogram[-2]}")
+                    lines.append(f"{name}_count{self._labels(labels)} {histogram[-1]}")
+            else:
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels, **extra):
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ""
+        escaped = (f'{key}="{Metrics._escape(value)}"' for key, value in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
+metrics.describe(
+    "pki_request_duration_seconds", "histogram", "HTTP request latency by resource"
+)
+metrics.describe(
+    "pki_dependency_duration_seconds",
+    "histogram",
+    "Latency of CSR generation, CA, certutil and database calls",
+)
+metrics.describe("pki_db_pool_wait_seconds", "histogram", "Connection pool borrow wait")
+metrics.describe("pki_ca_requests_total", "counter", "CA submissions by CA and outcome")
+metrics.describe(
+    "pki_outbound_request_duration_seconds",
+    "histogram",
+    "Outbound HTTP latency by client and host",
+)
+metrics.describe("pki_requests_in_flight", "gauge", "HTTP requests being served")
+metrics.describe(
+    "pki_db_pool_connections", "gauge", "Database pool connections by state"
+)
+metrics.describe("pki_cache_hits_total", "counter", "Cache hits by cache")
+metrics.describe("pki_cache_misses_total", "counter", "Cache misses by cache")
+metrics.describe("pki_cache_entries", "gauge", "Entries held by cache")
+metrics.describe("pki_key_pool_available", "gauge", "Pre-generated keys by type")
+metrics.describe("pki_audit_buffered_rows", "gauge", "Audit rows waiting to flush")
+pki_transport.add_timing_hook(
+    lambda client, method, host, status, seconds: metrics.observe(
+        "pki_outbound_request_duration_seconds", seconds, client=client, host=host
+    )
+)
+
+
+@contextmanager
+def timed(dependency):
+    """Time a downstream call; usable as a context manager or decorator"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe(
+            "pki_dependency_duration_seconds", elapsed, dependency=dependency
+        )
+        if has_request_context() and "phases" in g:
+            g.phases.append((dependency, elapsed))
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.phases = []
+    metrics.add("pki_requests_in_flight", 1)
+
+
+@app.after_request
+def record_request_status(response):
+    g.response_status = response.status_code
+    if response.is_streamed and "request_start" in g:
+        # Teardown runs before a streamed body is sent (and again at the end
+        # under stream_with_context), so time it from the response close
+        g.timing_deferred = True
+        timing = request_timing()
+        response.call_on_close(lambda: record_timing(*timing))
+    return response
+
+
+@app.teardown_request
+def record_request_duration(exc):
+    if "request_start" not in g or g.get("timing_deferred"):
+        return
+    record_timing(*request_timing())
+
+
+def request_timing():
+    view = app.view_functions.get(request.endpoint)
+    resource = getattr(view, "view_class", None)
+    resource = resource.__name__ if resource else request.endpoint or "unmatched"
+    return (
+        g.request_start,
+        resource,
+        request.method,
+        request.path,
+        g.get("response_status", 500),
+        g.phases,
+    )
+
+
+def record_timing(start, resource, method, path, status, phases):
+    elapsed = time.perf_counter() - start
+    metrics.add("pki_requests_in_flight", -1)
+    metrics.observe(
+        "pki_request_duration_seconds",
+        elapsed,
+        resource=resource,
+        method=method,
+        status=str(status),
+    )
+
+    if elapsed >= app.config["SLOW_REQUEST_THRESHOLD"] and (
+        random.random() < app.config["SLOW_REQUEST_SAMPLE_RATE"]
+    ):
+        phases = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in phases)
+        logging.warning(
+            f"Slow request {method} {path} -> {status} "
+            f"in {elapsed * 1000:.1f}ms [{phases}]"
+        )
+
+
 # Database connection
 conn_str = "DRIVER={SQL Server};SERVER=SQL-PKI-DB;DATABASE=PKI_Management;Trusted_Connection=yes;"
 
+# Database connection pool
+app.config["DB_POOL_MIN_SIZE"] = 2
+app.config["DB_POOL_MAX_SIZE"] = 20
+app.config["DB_POOL_TIMEOUT"] = 10  # seconds to wait for a free connection
+app.config["DB_POOL_IDLE_TIMEOUT"] = 300  # seconds before idle connections recycle
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of pyodbc connections"""
+
+    def __init__(self, conn_str, min_size=2, max_size=20, timeout=10, idle_timeout=300):
+        self.conn_str = conn_str
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._idle = deque()  # (connection, last_used) pairs, most recent on the right
+        self._size = 0  # connections currently open, idle or borrowed
+        self._cond = threading.Condition()
+
+        self._borrows = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def prefill(self):
+        """Open connections up to min_size"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = pyodbc.connect(self.conn_str)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        """Borrow a validated connection, waiting up to timeout for one to free up"""
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                while conn is None:
+                    self._evict_idle()
+                    if self._idle:
+                        conn, _ = self._idle.pop()
+                    elif self._size < self.max_size:
+                        self._size += 1
+                        break
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise PoolTimeout(
+                                f"No database connection available after {self.timeout}s"
+                            )
+                        self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = pyodbc.connect(self.conn_str)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_alive(conn):
+                # Broken connection - drop it and try again
+                self._discard(conn)
+                continue
+
+            self._record_wait(time.monotonic() - start)
+            return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool"""
+        if not discard:
+            try:
+                # Close any transaction left open by the borrower
+                conn.rollback()
+            except pyodbc.Error:
+                discard = True
+
+        if discard:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with block"""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except pyodbc.Error:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def stats(self):
+        """Pool occupancy and wait-time statistics"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "borrows": self._borrows,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "wait_avg_ms": (
+                    round(self._wait_total / self._borrows * 1000, 3)
+                    if self._borrows
+                    else 0.0
+                ),
+                "wait_max_ms": round(self._wait_max * 1000, 3),
+            }
+
+    def _evict_idle(self):
+        # Caller holds self._cond. Oldest idle connections sit on the left.
+        now = time.monotonic()
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.idle_timeout
+        ):
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._recycled += 1
+            self._close_quietly(conn)
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._recycled += 1
+            self._cond.notify()
+
+    def _record_wait(self, waited):
+        metrics.observe("pki_db_pool_wait_seconds", waited)
+        with self._cond:
+            self._borrows += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+
+db_pool = ConnectionPool(
+    conn_str,
+    min_size=app.config["DB_POOL_MIN_SIZE"],
+    max_size=app.config["DB_POOL_MAX_SIZE"],
+    timeout=app.config["DB_POOL_TIMEOUT"],
+    idle_timeout=app.config["DB_POOL_IDLE_TIMEOUT"],
+)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._generation = 0  # bumped by every invalidate()
+        self._tombstones = OrderedDict()  # key -> generation it was invalidated at
+        self._pruned = 0  # newest generation dropped from _tombstones
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        """Cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def generation(self):
+        """Token to pass to put() for a value loaded after this call"""
+        with self._lock:
+            return self._generation
+
+    def put(self, key, value, ttl=None, generation=None):
+        """Store value for ttl seconds (default self.ttl).
+
+        With generation, the value is dropped if key was invalidated since
+        generation() returned it, as the value may predate the change.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and (
+                self._tombstones.get(key, 0) > generation or self._pruned > generation
+            ):
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return None if entry is None else entry[0]
+
+    def invalidate(self, key):
+        """Drop key and refuse puts of values loaded before this call"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+            self._tombstones[key] = self._generation
+            self._tombstones.move_to_end(key)
+            while len(self._tombstones) > self.max_entries:
+                self._pruned = self._tombstones.popitem(last=False)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+# Pre-generated key pool
+app.config["KEY_POOL_TYPES"] = ["rsa2048", "ec-p256"]
+app.config["KEY_POOL_DEFAULT_TYPE"] = "rsa2048"
+app.config["KEY_POOL_SIZE"] = 32  # keys held per type
+app.config["KEY_POOL_LOW_WATER"] = 8  # refill when a type drops below this
+
+KEY_GENERATORS = {
+    "rsa2048": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "rsa3072": lambda: rsa.generate_private_key(public_exponent=65537, key_size=3072),
+    "rsa4096": lambda: rsa.generate_private_key(public_exponent=65537, key_size=4096),
+    "ec-p256": lambda: ec.generate_private_key(ec.SECP256R1()),
+    "ec-p384": lambda: ec.generate_private_key(ec.SECP384R1()),
+}
+
+# openssl -subj attribute names
+SUBJECT_OIDS = {
+    "CN": NameOID.COMMON_NAME,
+    "O": NameOID.ORGANIZATION_NAME,
+    "OU": NameOID.ORGANIZATIONAL_UNIT_NAME,
+    "C": NameOID.COUNTRY_NAME,
+    "ST": NameOID.STATE_OR_PROVINCE_NAME,
+    "L": NameOID.LOCALITY_NAME,
+    "emailAddress": NameOID.EMAIL_ADDRESS,
+}
+
+
+class KeyPool:
+    """Private keys generated ahead of time by a background thread"""
+
+    def __init__(self, key_types, size=32, low_water=8):
+        unknown = set(key_types) - set(KEY_GENERATORS)
+        if unknown:
+            raise ValueError(f"Unsupported key types: {', '.join(sorted(unknown))}")
+
+        self.size = size
+        self.low_water = low_water
+        self._keys = {key_type: deque() for key_type in key_types}
+        self._lock = threading.Lock()
+        self._refill = threading.Event()
+        self._thread = None
+
+        self._hits = 0
+        self._misses = 0
+
+    def start(self):
+        """Start the background refill thread"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="key-pool", daemon=True
+            )
+            self._thread.start()
+        self._refill.set()
+
+    def take(self, key_type):
+        """Take a pre-generated key, generating inline only if the pool is empty"""
+        if key_type not in KEY_GENERATORS:
+            raise ValueError(f"Unsupported key type: {key_type}")
+
+        if self._thread is None:
+            self.start()
+
+        key = None
+        with self._lock:
+            keys = self._keys.get(key_type)
+            if keys:
+                key = keys.popleft()
+                self._hits += 1
+            else:
+                self._misses += 1
+            low = keys is not None and len(keys) < self.low_water
+
+        if low:
+            self._refill.set()
+
+        if key is None:
+            key = KEY_GENERATORS[key_type]()
+
+        return key
+
+    def stats(self):
+        """Available keys per type and hit/miss counters"""
+        with self._lock:
+            return {
+                "available": {k: len(v) for k, v in self._keys.items()},
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def _run(self):
+        while True:
+            self._refill.wait()
+            self._refill.clear()
+
+            # Round-robin so one slow key type does not starve the others
+            pending = True
+            while pending:
+                pending = False
+                for key_type, keys in self._keys.items():
+                    if len(keys) < self.size:
+                        key = KEY_GENERATORS[key_type]()
+                        with self._lock:
+                            keys.append(key)
+                        pending = True
+
+
+key_pool = KeyPool(
+    app.config["KEY_POOL_TYPES"],
+    size=app.config["KEY_POOL_SIZE"],
+    low_water=app.config["KEY_POOL_LOW_WATER"],
+)
+
+
+def parse_subject(subject):
+    """Convert an openssl-style subject (/C=AU/O=Company/CN=host) to an x509.Name"""
+    attributes = []
+    for part in subject.strip("/").split("/"):
+        if not part:
+            continue
+        name, _, value = part.partition("=")
+        if name not in SUBJECT_OIDS or not value:
+            raise ValueError(f"Invalid subject component: {part}")
+        attributes.append(x509.NameAttribute(SUBJECT_OIDS[name], value))
+    return x509.Name(attributes)
+
+
+# Certificate Authority web enrollment
+app.config["CA_URLS"] = [
+    "https://pki-ica-01.company.local/certsrv/certfnsh.asp",
+    "https://pki-ica-02.company.local/certsrv/certfnsh.asp",
+]
+app.config["CA_POOL_SIZE"] = 16  # keep-alive connections per CA
+app.config["CA_TIMEOUT"] = (5, 30)  # connect, read seconds
+app.config["CA_RETRIES"] = 2  # extra passes over the CA list
+app.config["CA_BACKOFF"] = 0.5  # seconds, doubled on each pass
+app.config["CA_FAILOVER_COOLDOWN"] = 60  # seconds a failing CA is tried last
+
+# certfnsh.asp reports the serial as "Serial Number: 1a 2b 3c ...<"
+SERIAL_PATTERN = re.compile(rb"Serial Number:\s*([0-9A-Fa-f][0-9A-Fa-f ]*?)\s*<")
+SERIAL_SEARCH_OVERLAP = 256  # bytes kept between chunks so a match can straddle them
+CA_DRAIN_LIMIT = 65536  # read the rest of a response this small to keep the socket
+
+
+class CAError(Exception):
+    pass
+
+
+class CAClient:
+    """Keep-alive client for certsrv web enrollment with retry and failover"""
+
+    def __init__(
+        self,
+        urls,
+        auth,
+        pool_size=16,
+        timeout=(5, 30),
+        retries=2,
+        backoff=0.5,
+        failover_cooldown=60,
+    ):
+        self.urls = list(urls)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.failover_cooldown = failover_cooldown
+        self._down_until = {}
+        self._lock = threading.Lock()
+
+        # Retries and failover are handled in submit()
+        self.session = pki_transport.create_session(
+            "ca",
+            pool_size=pool_size,
+            hosts=len(self.urls),
+            timeout=timeout,
+            retries=0,
+        )
+        self.session.auth = auth
+
+    def submit(self, payload):
+        """POST a request to the first CA that answers and return the serial.
+
+        newreq is not idempotent, so a request moves to the next CA only
+        when the previous one provably did not process it.
+        """
+        last_error = None
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+            for url in self._ordered_urls():
+                host = url.split("/")[2]
+                try:
+                    response = self.session.post(
+                        url, data=payload, timeout=self.timeout, stream=True
+                    )
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    self._mark_down(url)
+                    metrics.add("pki_ca_requests_total", 1, ca=host, outcome="error")
+                    if not self._not_sent(e):
+                        # Read timeout or dropped response: it may have issued
+                        raise CAError(f"{host} outcome unknown: {str(e)}")
+                    last_error = e
+                    continue
+
+                if response.status_code >= 500:
+                    # An empty 5xx or a 503 comes from before certsrv ran
+                    unprocessed = response.status_code == 503 or not response.content
+                    response.close()
+                    self._mark_down(url)
+                    metrics.add("pki_ca_requests_total", 1, ca=host, outcome="5xx")
+                    if not unprocessed:
+                        raise CAError(f"{host} returned {response.status_code}")
+                    last_error = CAError(f"{host} returned {response.status_code}")
+                    continue
+
+                if response.status_code != 200:
+                    response.close()
+                    metrics.add("pki_ca_requests_total", 1, ca=host, outcome="rejected")
+                    raise CAError(f"{host} rejected request: {response.status_code}")
+
+                metrics.add("pki_ca_requests_total", 1, ca=host, outcome="ok")
+                return self._read_serial(response)
+
+        raise CAError(f"All CAs failed after {self.retries + 1} attempts: {last_error}")
+
+    @staticmethod
+    def _not_sent(error):
+        # Only a failed connect proves the CA never saw the request
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def _read_serial(self, response):
+        # Scan the body as it arrives and stop once the serial is found
+        tail = b""
+        try:
+            for chunk in response.iter_content(chunk_size=8192):
+                window = tail + chunk
+                match = SERIAL_PATTERN.search(window)
+                if match:
+                    self._release(response)
+                    return match.group(1).decode().replace(" ", "")
+                tail = window[-SERIAL_SEARCH_OVERLAP:]
+        finally:
+            response.close()
+
+        raise CAError("Serial number not found in CA response")
+
+    @staticmethod
+    def _release(response):
+        # Small remainders are drained so the keep-alive connection is reused;
+        # large or unknown ones are dropped by close()
+        length = response.headers.get("Content-Length")
+        if length is not None and int(length) <= CA_DRAIN_LIMIT:
+            for _ in response.iter_content(chunk_size=8192):
+                pass
+
+    def _ordered_urls(self):
+        now = time.monotonic()
+        with self._lock:
+            healthy = [u for u in self.urls if self._down_until.get(u, 0) <= now]
+            down = [u for u in self.urls if self._down_until.get(u, 0) > now]
+        return healthy + down
+
+    def _mark_down(self, url):
+        with self._lock:
+            self._down_until[url] = time.monotonic() + self.failover_cooldown
+
+
+ca_client = CAClient(
+    app.config["CA_URLS"],
+    auth=("domain\\username", "password"),
+    pool_size=app.config["CA_POOL_SIZE"],
+    timeout=app.config["CA_TIMEOUT"],
+    retries=app.config["CA_RETRIES"],
+    backoff=app.config["CA_BACKOFF"],
+    failover_cooldown=app.config["CA_FAILOVER_COOLDOWN"],
+)
+
+
+def private_key_pem(private_key):
+    """Serialise a private key as unencrypted PKCS#8 PEM"""
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+
+
+# Audit logging
+app.config["AUDIT_WRITE_BEHIND"] = True
+app.config["AUDIT_BATCH_SIZE"] = 200  # flush when this many rows are buffered
+app.config["AUDIT_FLUSH_INTERVAL"] = 2  # seconds between time-based flushes
+app.config["AUDIT_MAX_BUFFER"] = 10000  # rows beyond this go straight to the spill file
+app.config["AUDIT_SPILL_FILE"] = "/var/lib/pki-api/audit-spill.ndjson"
+
+
+@timed("db_insert_audit")
+def insert_audit_rows(rows):
+    """Insert CertificateRequests rows in a single transaction"""
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+
+        cursor.executemany(
+            """
+            INSERT INTO CertificateRequests
+            (RequestDate, Template, Subject, SAN, Serial, Requester, Status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+            rows,
+        )
+
+        conn.commit()
+
+
+class AuditWriter:
+    """Write-behind buffer for audit rows with a local spill file for DB outages"""
+
+    def __init__(self, spill_path, batch_size=200, flush_interval=2, max_buffer=10000):
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._spill_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._closed = False
+
+        self._flushed = 0
+        self._spilled = 0
+
+    def start(self):
+        """Check the spill directory and start the background flush thread"""
+        with self._lock:
+            if self._thread is None:
+                self._check_spill_dir()
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-writer", daemon=True
+                )
+                self._thread.start()
+
+    def write(self, rows):
+        """Queue rows for the next flush"""
+        if self._thread is None:
+            self.start()
+
+        with self._lock:
+            overflow = self._closed or len(self._buffer) + len(rows) > self.max_buffer
+            if not overflow:
+                self._buffer.extend(rows)
+                full = len(self._buffer) >= self.batch_size
+
+        if overflow:
+            try:
+                self._spill(rows)
+            except OSError as e:
+                # Never fail the issuance request over its audit row
+                logging.error(f"Audit spill failed, {len(rows)} rows lost: {str(e)}")
+        elif full:
+            self._wake.set()
+
+    def flush(self):
+        """Write buffered and spilled rows to the database, spilling on failure"""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+
+            try:
+                self._replay_spill()
+                if rows:
+                    insert_audit_rows(rows)
+            except Exception as e:
+                logging.error(f"Audit flush failed: {str(e)}")
+                try:
+                    self._spill(rows)
+                except OSError as spill_error:
+                    logging.error(f"Audit spill failed: {str(spill_error)}")
+                    self._requeue(rows)
+                return
+
+            if rows:
+                with self._lock:
+                    self._flushed += len(rows)
+                expiry_index.issued()
+
+    def close(self):
+        """Flush everything still buffered; called at interpreter exit"""
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "flushed": self._flushed,
+                "spilled": self._spilled,
+                "spill_pending": os.path.exists(self.spill_path)
+                or os.path.exists(self.spill_path + ".replay"),
+            }
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Keep the thread alive; the next interval retries
+                logging.exception("Audit writer flush raised")
+
+    def _check_spill_dir(self):
+        directory = os.path.dirname(self.spill_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            logging.error(f"Audit spill directory {directory} unusable: {str(e)}")
+            return
+        if not os.access(directory, os.W_OK):
+            logging.error(f"Audit spill directory {directory} is not writable")
+
+    def _requeue(self, rows):
+        # Put unspillable rows back for the next flush, within max_buffer
+        with self._lock:
+            room = max(self.max_buffer - len(self._buffer), 0)
+            self._buffer.extendleft(reversed(rows[:room]))
+        if len(rows) > room:
+            logging.error(f"Audit buffer full, {len(rows) - room} rows lost")
+
+    def _spill(self, rows):
+        if not rows:
+            return
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, "a") as f:
+                for row in rows:
+                    f.write(json.dumps([row[0].isoformat(), *row[1:]]) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        with self._lock:
+            self._spilled += len(rows)
+
+    def _replay_spill(self):
+        # Move the spill file aside first so concurrent spills start a new file
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        rows = []
+        lines = []
+        corrupt = []
+        with open(replay_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                # A crash mid-append can leave a torn line; set it aside
+                # instead of blocking every later replay behind it
+                try:
+                    row = json.loads(line)
+                    rows.append((datetime.fromisoformat(row[0]), *row[1:]))
+                    lines.append(line if line.endswith("\n") else line + "\n")
+                except (ValueError, TypeError, IndexError):
+                    corrupt.append(line if line.endswith("\n") else line + "\n")
+
+        if corrupt:
+            with open(self.spill_path + ".corrupt", "a") as f:
+                f.writelines(corrupt)
+            # Keep only the good rows, so a failed insert below retries
+            # them without quarantining the same lines again
+            with open(replay_path + ".tmp", "w") as f:
+                f.writelines(lines)
+            os.replace(replay_path + ".tmp", replay_path)
+            logging.error(
+                f"Quarantined {len(corrupt)} unreadable spilled audit rows to "
+                f"{self.spill_path}.corrupt"
+            )
+
+        if rows:
+            insert_audit_rows(rows)
+            logging.info(f"Replayed {len(rows)} spilled audit rows")
+
+        os.remove(replay_path)
+
+
+audit_writer = AuditWriter(
+    app.config["AUDIT_SPILL_FILE"],
+    batch_size=app.config["AUDIT_BATCH_SIZE"],
+    flush_interval=app.config["AUDIT_FLUSH_INTERVAL"],
+    max_buffer=app.config["AUDIT_MAX_BUFFER"],
+)
+atexit.register(audit_writer.close)
+
 
 class CertificateRequest(Resource):
     @jwt_required()
@@ -34,75 +1052,77 @@ class CertificateRequest(Resource):
         if not all(field in data for field in required_fields):
             return {"error": "Missing required fields"}, 400
 
-        try:
-            # Generate CSR
-            csr = self.generate_csr(data["subject"], data["san"])
+        requester = request.headers.get("X-User")
 
-            # Submit to CA
-            cert_serial = self.submit_to_ca(csr, data["template"])
+        if data.get("async", app.config["ISSUANCE_ASYNC"]):
+            try:
+                job_id = issuance_jobs.submit(data, requester, get_jwt_identity())
+            except QueueFull as e:
+                return {"error": str(e)}, 503
 
-            # Log request
-            self.log_request(data, cert_serial)
+            return (
+                {
+                    "status": "accepted",
+                    "job_id": job_id,
+                    "message": "Certificate request queued",
+                },
+                202,
+                {"Location": f"/api/certificate/request/{job_id}"},
+            )
+
+        try:
+            private_key, cert_serial = self.issue(data, requester)
 
             return {
                 "status": "success",
                 "serial": cert_serial,
+                "private_key": private_key_pem(private_key),
                 "message": "Certificate request submitted successfully",
             }, 201
 
+        except ValueError as e:
+            return {"error": str(e)}, 400
         except Exception as e:
             logging.error(f"Certificate request failed: {str(e)}")
             return {"error": str(e)}, 500
 
-    def generate_csr(self, subject, san):
-        """Generate certificate signing request"""
-        config = f"""
-        [req]
-        distinguished_name = req_distinguished_name
-        req_extensions = v3_req
+    def issue(self, data, requester):
+        """Generate CSR, submit to CA and log the request"""
+        # Generate CSR
+        private_key, csr = self.generate_csr(
+            data["subject"], data["san"], data.get("key_type")
+        )
 
-        [req_distinguished_name]
+        # Submit to CA
+        cert_serial = self.submit_to_ca(csr, data["template"])
 
-        [v3_req]
-        subjectAltName = @alt_names
+        # Log request
+        self.log_request(data, cert_serial, requester)
 
-        [alt_names]
-        DNS.1 = {san}
-        """
+        return private_key, cert_serial
 
-        # Write config to temp file
-        with open("/tmp/csr.conf", "w") as f:
-            f.write(config)
-
-        # Generate private key and CSR
-        subprocess.run(
-            [
-                "openssl",
-                "req",
-                "-new",
-                "-newkey",
-                "rsa:2048",
-                "-nodes",
-                "-keyout",
-                "/tmp/private.key",
-                "-out",
-                "/tmp/request.csr",
-                "-subj",
-                subject,
-                "-config",
-                "/tmp/csr.conf",
-            ]
-        )
+    @timed("generate_csr")
+    def generate_csr(self, subject, san, key_type=None):
+        """Generate certificate signing request"""
+        private_key = key_pool.take(key_type or app.config["KEY_POOL_DEFAULT_TYPE"])
 
-        with open("/tmp/request.csr", "r") as f:
-            csr = f.read()
+        names = [san] if isinstance(san, str) else san
 
-        return csr
+        csr = (
+            x509.CertificateSigningRequestBuilder()
+            .subject_name(parse_subject(subject))
+            .add_extension(
+                x509.SubjectAlternativeName([x509.DNSName(name) for name in names]),
+                critical=False,
+            )
+            .sign(private_key, hashes.SHA256())
+        )
 
+        return private_key, csr.public_bytes(serialization.Encoding.PEM).decode()
+
+    @timed("submit_to_ca")
     def submit_to_ca(self, csr, template):
         """Submit CSR to Certificate Authority"""
-        ca_url = "https://pki-ica-01.company.local/certsrv/certfnsh.asp"
-
         payload = {
             "Mode": "newreq",
             "CertRequest": csr,
@@ -111,38 +1131,260 @@ class CertificateRequest(Resource):
             "SaveCert": "yes",
         }
 
-        response = requests.post(
-            ca_url, data=payload, auth=("domain\\username", "password")
-        )
-
-        # Parse response for serial number
-        # This is simplified - actual implementation would parse HTML response
-        serial = response.text.split("Serial Number:")[1].split("<")[0].strip()
-
+        serial = ca_client.submit(payload)
+        revocation_index.add_issued([serial])
         return serial
 
-    def log_request(self, data, serial):
+    def log_request(self, data, serial, requester):
         """Log certificate request to database"""
-        conn = pyodbc.connect(conn_str)
-        cursor = conn.cursor()
+        self.log_requests([(data, serial)], requester)
 
-        cursor.execute(
-            """
-            INSERT INTO CertificateRequests
-            (RequestDate, Template, Subject, SAN, Serial, Requester, Status)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-            datetime.now(),
-            data["template"],
-            data["subject"],
-            data.get("san"),
-            serial,
-            request.headers.get("X-User"),
-            "Issued",
+    @timed("log_request")
+    def log_requests(self, issued, requester):
+        """Log (data, serial) pairs to database, write-behind if enabled"""
+        rows = [
+            (
+                datetime.now(),
+                data["template"],
+                data["subject"],
+                (
+                    ", ".join(data["san"])
+                    if isinstance(data.get("san"), list)
+                    else data.get("san")
+                ),
+                serial,
+                requester,
+                "Issued",
+            )
+            for data, serial in issued
+        ]
+
+        if app.config["AUDIT_WRITE_BEHIND"]:
+            audit_writer.write(rows)
+        else:
+            insert_audit_rows(rows)
+            expiry_index.issued()
+
+
+# Batch issuance
+app.config["BATCH_MAX_ITEMS"] = 500
+app.config["BATCH_CONCURRENCY"] = 8  # concurrent CA submissions per batch
+
+
+class CertificateRequestBatch(Resource):
+    @jwt_required()
+    def post(self):
+        """Submit a batch of certificate requests"""
+        data = request.get_json()
+        items = data.get("requests") if isinstance(data, dict) else data
+
+        if not isinstance(items, list) or not items:
+            return {"error": "requests must be a non-empty list"}, 400
+
+        if len(items) > app.config["BATCH_MAX_ITEMS"]:
+            return {
+                "error": f"Batch exceeds {app.config['BATCH_MAX_ITEMS']} requests"
+            }, 400
+
+        requester = request.headers.get("X-User")
+        issuer = CertificateRequest()
+        required_fields = ["template", "subject", "san"]
+        results = [None] * len(items)
+        issued = []
+
+        def issue_one(item):
+            private_key, csr = issuer.generate_csr(
+                item["subject"], item["san"], item.get("key_type")
+            )
+            return private_key, issuer.submit_to_ca(csr, item["template"])
+
+        workers = min(app.config["BATCH_CONCURRENCY"], len(items))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for index, item in enumerate(items):
+                if not isinstance(item, dict) or not all(
+                    field in item for field in required_fields
+                ):
+                    results[index] = {
+                        "index": index,
+                        "status": "error",
+                        "error": "Missing required fields",
+                    }
+                    continue
+                futures[executor.submit(issue_one, item)] = index
+
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    private_key, serial = future.result()
+                except Exception as e:
+                    logging.error(f"Batch certificate request {index} failed: {str(e)}")
+                    results[index] = {
+                        "index": index,
+                        "status": "error",
+                        "error": str(e),
+                    }
+                    continue
+
+                issued.append((items[index], serial))
+                results[index] = {
+                    "index": index,
+                    "status": "success",
+                    "serial": serial,
+                    "private_key": private_key_pem(private_key),
+                }
+
+        logged = True
+        if issued:
+            try:
+                issuer.log_requests(issued, requester)
+            except Exception as e:
+                # Certificates are already issued - report rather than fail the batch
+                logging.error(f"Batch audit logging failed: {str(e)}")
+                logged = False
+
+        succeeded = sum(1 for result in results if result["status"] == "success")
+
+        return {
+            "status": "complete",
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": len(items) - succeeded,
+            "logged": logged,
+            "results": results,
+        }, 200
+
+
+# Asynchronous issuance
+app.config["ISSUANCE_ASYNC"] = (
+    False  # default when the request body has no "async" flag
+)
+app.config["ISSUANCE_WORKERS"] = 8
+app.config["ISSUANCE_MAX_PENDING"] = 1000
+app.config["ISSUANCE_JOB_TTL"] = 3600  # seconds a finished job stays queryable
+
+
+class QueueFull(Exception):
+    pass
+
+
+class IssuanceJobs:
+    """Bounded worker pool that runs certificate issuance in the background"""
+
+    def __init__(self, workers=8, max_pending=1000, job_ttl=3600):
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="issuance"
         )
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
 
-        conn.commit()
-        conn.close()
+    def submit(self, data, requester, owner):
+        """Queue an issuance job for the JWT identity owner and return its ID"""
+        with self._lock:
+            self._expire()
+            if self._pending >= self.max_pending:
+                raise QueueFull("Issuance queue is full, retry later")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "serial": None,
+                "private_key": None,
+                "error": None,
+                "submitted": datetime.now().isoformat(),
+                "completed": None,
+                "_owner": owner,
+                "_finished_at": None,
+            }
+            self._pending += 1
+
+        self._executor.submit(self._run, job_id, data, requester)
+        return job_id
+
+    def get(self, job_id, owner):
+        """Public view of owner's job, or None if unknown, expired or not theirs"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["_owner"] != owner:
+                return None
+            view = {k: v for k, v in job.items() if not k.startswith("_")}
+            # The private key is handed out once, then dropped from memory
+            job["private_key"] = None
+            return view
+
+    def _run(self, job_id, data, requester):
+        self._update(job_id, status="running")
+        try:
+            private_key, serial = CertificateRequest().issue(data, requester)
+            self._update(
+                job_id,
+                status="issued",
+                serial=serial,
+                private_key=private_key_pem(private_key),
+            )
+        except Exception as e:
+            logging.error(f"Certificate request job {job_id} failed: {str(e)}")
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if fields.get("status") in ("issued", "failed"):
+                job["completed"] = datetime.now().isoformat()
+                job["_finished_at"] = time.monotonic()
+
+    def _expire(self):
+        # Caller holds self._lock
+        cutoff = time.monotonic() - self.job_ttl
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job["_finished_at"] is not None and job["_finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+issuance_jobs = IssuanceJobs(
+    workers=app.config["ISSUANCE_WORKERS"],
+    max_pending=app.config["ISSUANCE_MAX_PENDING"],
+    job_ttl=app.config["ISSUANCE_JOB_TTL"],
+)
+
+
+class CertificateRequestStatus(Resource):
+    @jwt_required()
+    def get(self, job_id):
+        """Report status of an asynchronous certificate request"""
+        job = issuance_jobs.get(job_id, get_jwt_identity())
+
+        if job is None:
+            return {"error": "Job not found"}, 404
+
+        return job, 200
+
+
+# Certificate retrieval cache
+app.config["CERT_CACHE_SIZE"] = 10000
+app.config["CERT_CACHE_TTL"] = 600  # seconds
+
+certificate_cache = LRUCache(
+    max_entries=app.config["CERT_CACHE_SIZE"],
+    ttl=app.config["CERT_CACHE_TTL"],
+)
+
+
+def normalise_serial(serial):
+    """Upper-case hex serial without colons or spaces"""
+    return serial.replace(":", "").replace(" ", "").upper()
 
 
 class CertificateRetrieval(Resource):
@@ -150,7 +1392,31 @@ class CertificateRetrieval(Resource):
     def get(self, serial):
         """Retrieve certificate by serial number"""
         try:
-            conn = pyodbc.connect(conn_str)
+            key = normalise_serial(serial)
+            cached = certificate_cache.get(key)
+
+            if cached is None:
+                generation = certificate_cache.generation()
+                cached = self.load(serial)
+                if cached is None:
+                    return {"error": "Certificate not found"}, 404
+                # Skipped if the certificate was revoked while it loaded
+                certificate_cache.put(key, cached, generation=generation)
+
+            body, etag = cached
+            if request.if_none_match.contains(etag):
+                return "", 304, {"ETag": f'"{etag}"'}
+
+            return body, 200, {"ETag": f'"{etag}"'}
+
+        except Exception as e:
+            logging.error(f"Certificate retrieval failed: {str(e)}")
+            return {"error": str(e)}, 500
+
+    @timed("db_select_certificate")
+    def load(self, serial):
+        """Read a certificate from the database as (response body, ETag)"""
+        with db_pool.connection() as conn:
             cursor = conn.cursor()
 
             cursor.execute(
@@ -164,21 +1430,515 @@ class CertificateRetrieval(Resource):
 
             row = cursor.fetchone()
 
-            if row:
-                return {
-                    "serial": serial,
-                    "certificate": base64.b64encode(row[0]).decode(),
-                    "issued": row[1].isoformat(),
-                    "expiry": row[2].isoformat(),
-                    "status": row[3],
-                }, 200
+        if not row:
+            return None
+
+        body = {
+            "serial": serial,
+            "certificate": base64.b64encode(row[0]).decode(),
+            "issued": row[1].isoformat(),
+            "expiry": row[2].isoformat(),
+            "status": row[3],
+        }
+        etag = hashlib.sha256(bytes(row[0]) + str(row[3]).encode()).hexdigest()[:32]
+
+        return body, etag
+
+
+# Expiry index
+app.config["EXPIRY_INDEX_HORIZON_DAYS"] = (
+    90  # windows up to this are served from memory
+)
+app.config["EXPIRY_INDEX_REFRESH_INTERVAL"] = 300  # seconds
+app.config["EXPIRY_INDEX_FULL_RELOAD_INTERVAL"] = 3600  # seconds
+app.config["EXPIRY_EXPORT_PAGE_SIZE"] = 1000
+app.config["EXPIRY_EXPORT_MAX_DAYS"] = 3650  # longer windows are rejected
+
+
+class ExpiryIndex:
+    """Sorted (ExpiryDate, Serial) index of live certificates inside the horizon"""
+
+    def __init__(
+        self, horizon_days=90, refresh_interval=300, full_reload_interval=3600
+    ):
+        self.horizon = timedelta(days=horizon_days)
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._entries = []  # sorted (expiry, serial)
+        self._expiry_by_serial = {}
+        self._upper = None  # entries are complete up to this ExpiryDate
+        self._issued_high_water = None  # latest IssuedDate seen
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()  # held across the first reload
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Load the index and start the background refresh thread, once"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            try:
+                self.reload()
+            except Exception as e:
+                # The refresh thread retries the load; requests use the database
+                logging.error(f"Expiry index load failed: {str(e)}")
+            self._thread = threading.Thread(
+                target=self._run, name="expiry-index", daemon=True
+            )
+            self._thread.start()
+
+    def covers(self, until):
+        return self._upper is not None and until <= self._upper
+
+    def expiring(self, until, chunk_size=1000):
+        """Yield (expiry, serial) from now until the given time, a chunk at a time"""
+        position = (datetime.now(), "")
+        while True:
+            with self._lock:
+                start = bisect.bisect_right(self._entries, position)
+                chunk = self._entries[start : start + chunk_size]
+            for entry in chunk:
+                if entry[0] > until:
+                    return
+                yield entry
+            if len(chunk) < chunk_size:
+                return
+            position = chunk[-1]
+
+    def issued(self):
+        """Wake the refresh thread after new certificates are logged"""
+        self._wake.set()
+
+    def remove(self, serials):
+        """Drop revoked serials from the index"""
+        with self._lock:
+            for serial in serials:
+                expiry = self._expiry_by_serial.pop(serial, None)
+                if expiry is None:
+                    continue
+                index = bisect.bisect_left(self._entries, (expiry, serial))
+                if index < len(self._entries) and self._entries[index] == (
+                    expiry,
+                    serial,
+                ):
+                    del self._entries[index]
+
+    def reload(self):
+        """Rebuild the index from every live certificate inside the horizon"""
+        now = datetime.now()
+        upper = now + self.horizon
+        entries = []
+        expiry_by_serial = {}
+        issued_high_water = now
+
+        rows = self._query(
+            """
+            SELECT Serial, ExpiryDate, IssuedDate
+            FROM Certificates
+            WHERE Status <> 'Revoked' AND ExpiryDate > ? AND ExpiryDate <= ?
+        """,
+            now,
+            upper,
+        )
+        for serial, expiry, issued in rows:
+            expiry_by_serial[serial] = expiry
+            entries.append((expiry, serial))
+            if issued and issued > issued_high_water:
+                issued_high_water = issued
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._expiry_by_serial = expiry_by_serial
+            self._issued_high_water = issued_high_water
+            self._upper = upper
+            self._loaded_at = time.monotonic()
+
+        logging.info(f"Expiry index loaded with {len(entries)} certificates")
+
+    def refresh(self):
+        """Extend the horizon, add newly issued certificates and drop expired ones"""
+        # Full reloads also drop certificates revoked by other processes
+        if (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at >= self.full_reload_interval
+        ):
+            self.reload()
+            return
+
+        now = datetime.now()
+        upper = now + self.horizon
+        lower = self._upper
+
+        # Certificates that have moved inside the horizon since the last refresh
+        rows = self._query(
+            """
+            SELECT Serial, ExpiryDate, IssuedDate
+            FROM Certificates
+            WHERE Status <> 'Revoked' AND ExpiryDate > ? AND ExpiryDate <= ?
+        """,
+            lower,
+            upper,
+        )
+        self._merge(rows)
+
+        # Certificates issued since the last refresh that expire inside the horizon
+        rows = self._query(
+            """
+            SELECT Serial, ExpiryDate, IssuedDate
+            FROM Certificates
+            WHERE Status <> 'Revoked' AND IssuedDate >= ?
+                AND ExpiryDate > ? AND ExpiryDate <= ?
+        """,
+            self._issued_high_water,
+            now,
+            upper,
+        )
+        self._merge(rows)
+
+        with self._lock:
+            cut = bisect.bisect_left(self._entries, (now, ""))
+            for _, serial in self._entries[:cut]:
+                del self._expiry_by_serial[serial]
+            del self._entries[:cut]
+            self._upper = upper
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "covers_until": self._upper.isoformat() if self._upper else None,
+            }
+
+    def _merge(self, rows):
+        for serial, expiry, issued in rows:
+            with self._lock:
+                if issued and issued > self._issued_high_water:
+                    self._issued_high_water = issued
+                if serial in self._expiry_by_serial:
+                    continue
+                self._expiry_by_serial[serial] = expiry
+                bisect.insort(self._entries, (expiry, serial))
+
+    def _query(self, sql, *params):
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, *params)
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                yield from rows
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Expiry index refresh failed: {str(e)}")
+
+
+expiry_index = ExpiryIndex(
+    horizon_days=app.config["EXPIRY_INDEX_HORIZON_DAYS"],
+    refresh_interval=app.config["EXPIRY_INDEX_REFRESH_INTERVAL"],
+    full_reload_interval=app.config["EXPIRY_INDEX_FULL_RELOAD_INTERVAL"],
+)
+
+
+def expiring_from_database(until, page_size=1000):
+    """Yield (expiry, serial) up to the given time using keyset pagination"""
+    last_expiry, last_serial = datetime.now(), ""
+
+    while True:
+        # A fresh borrow per page so a slow reader never pins a connection
+        with timed("db_select_expiring"), db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT TOP (?) ExpiryDate, Serial
+                FROM Certificates
+                WHERE Status <> 'Revoked' AND ExpiryDate <= ?
+                    AND (ExpiryDate > ? OR (ExpiryDate = ? AND Serial > ?))
+                ORDER BY ExpiryDate, Serial
+            """,
+                page_size,
+                until,
+                last_expiry,
+                last_expiry,
+                last_serial,
+            )
+            rows = cursor.fetchall()
+
+        for expiry, serial in rows:
+            yield expiry, serial
+
+        if len(rows) < page_size:
+            return
+        last_expiry, last_serial = rows[-1][0], rows[-1][1]
+
+
+class CertificateExpiring(Resource):
+    @jwt_required()
+    def get(self):
+        """Stream certificates expiring within ?days=N as NDJSON"""
+        try:
+            days = int(request.args.get("days", 30))
+        except ValueError:
+            return {"error": "days must be an integer"}, 400
+        max_days = app.config["EXPIRY_EXPORT_MAX_DAYS"]
+        if not 0 <= days <= max_days:
+            return {"error": f"days must be between 0 and {max_days}"}, 400
+
+        until = datetime.now() + timedelta(days=days)
+        page_size = app.config["EXPIRY_EXPORT_PAGE_SIZE"]
+
+        # Loaded at startup; until then every window is read from the database
+        if expiry_index.covers(until):
+            rows = expiry_index.expiring(until, chunk_size=page_size)
+        else:
+            rows = expiring_from_database(until, page_size=page_size)
+
+        def generate():
+            for expiry, serial in rows:
+                yield json.dumps(
+                    {"serial": serial, "expiry": expiry.isoformat()}
+                ) + "\n"
+
+        return Response(generate(), mimetype="application/x-ndjson")
+
+
+# Revocation status index
+app.config["REVOCATION_REFRESH_INTERVAL"] = 60  # seconds between delta refreshes
+app.config["REVOCATION_FULL_RELOAD_INTERVAL"] = 3600  # seconds between full reloads
+
+
+def serial_to_int(serial):
+    """Normalise a hex serial (any case, optional colons/spaces) to an integer"""
+    return int(normalise_serial(serial), 16)
+
+
+class RevocationIndex:
+    """In-memory issued and revoked serial sets, refreshed from the database"""
+
+    def __init__(self, refresh_interval=60, full_reload_interval=3600):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self._issued = set()
+        self._revoked = set()
+        self._high_water = None  # latest (IssuedDate, RevokedDate) seen
+        self._loaded_at = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Load the index and start the background refresh thread"""
+        if self._loaded_at is None:
+            self.reload()
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="revocation-index", daemon=True
+                )
+                self._thread.start()
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def status(self, serial):
+        """ "revoked", "good", or "unknown" for serials this CA never issued"""
+        value = serial_to_int(serial)
+        if value in self._revoked:
+            return "revoked"
+        return "good" if value in self._issued else "unknown"
+
+    def add_issued(self, serials):
+        """Record serials issued by this process ahead of the next refresh"""
+        added = self._to_ints(serials)
+        with self._lock:
+            self._issued.update(added)
+
+    def add(self, serials):
+        """Record serials revoked by this process"""
+        added = self._to_ints(serials)
+        with self._lock:
+            self._revoked.update(added)
+
+    def reload(self):
+        """Rebuild the index from every certificate"""
+        issued, revoked, high_water = self._scan(None)
+
+        with self._lock:
+            self._issued = set(issued)
+            self._revoked = set(revoked)
+            self._high_water = high_water
+            self._loaded_at = self._refreshed_at = time.monotonic()
+
+        logging.info(
+            f"Revocation index loaded with {len(self._issued)} issued and "
+            f"{len(self._revoked)} revoked serials"
+        )
+
+    def refresh(self):
+        """Add certificates issued or revoked since the last load or refresh"""
+        issued, revoked, high_water = self._scan(self._high_water)
+
+        with self._lock:
+            self._issued.update(issued)
+            self._revoked.update(revoked)
+            self._high_water = high_water
+            self._refreshed_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "issued": len(self._issued),
+                "revoked": len(self._revoked),
+                "high_water": (
+                    self._high_water[1].isoformat()
+                    if self._high_water and self._high_water[1]
+                    else None
+                ),
+                "refreshed_seconds_ago": (
+                    round(time.monotonic() - self._refreshed_at, 1)
+                    if self._refreshed_at
+                    else None
+                ),
+            }
+
+    @staticmethod
+    def _to_ints(serials):
+        values = []
+        for serial in serials:
+            try:
+                values.append(serial_to_int(serial))
+            except ValueError:
+                logging.warning(
+                    f"Skipping non-hex serial {serial!r} in revocation index"
+                )
+        return values
+
+    def _scan(self, since):
+        # Stream rows into integer serials and the newest IssuedDate/RevokedDate
+        issued, revoked = [], []
+        issued_high, revoked_high = since or (None, None)
+        for serial, status, issued_date, revoked_date in self._query(since):
+            values = self._to_ints([serial])
+            issued.extend(values)
+            if status == "Revoked":
+                revoked.extend(values)
+            if issued_date and (issued_high is None or issued_date > issued_high):
+                issued_high = issued_date
+            if revoked_date and (revoked_high is None or revoked_date > revoked_high):
+                revoked_high = revoked_date
+        return issued, revoked, (issued_high, revoked_high)
+
+    def _query(self, since):
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            if since is None:
+                cursor.execute("""
+                    SELECT Serial, Status, IssuedDate, RevokedDate
+                    FROM Certificates
+                """)
             else:
-                return {"error": "Certificate not found"}, 404
+                # >= so rows sharing a high-water timestamp are not missed
+                issued_since, revoked_since = since
+                cursor.execute(
+                    """
+                    SELECT Serial, Status, IssuedDate, RevokedDate
+                    FROM Certificates
+                    WHERE IssuedDate >= ?
+                       OR (Status = 'Revoked' AND RevokedDate >= ?)
+                """,
+                    issued_since or datetime.min,
+                    revoked_since or datetime.min,
+                )
+
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                yield from rows
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                # Full reloads pick up certificates released from hold
+                if time.monotonic() - self._loaded_at >= self.full_reload_interval:
+                    self.reload()
+                else:
+                    self.refresh()
+            except Exception as e:
+                logging.error(f"Revocation index refresh failed: {str(e)}")
+
+
+revocation_index = RevocationIndex(
+    refresh_interval=app.config["REVOCATION_REFRESH_INTERVAL"],
+    full_reload_interval=app.config["REVOCATION_FULL_RELOAD_INTERVAL"],
+)
 
+
+class CertificateStatus(Resource):
+    def get(self, serial):
+        """Revocation status from the in-memory index"""
+        # Loaded at startup; never from a request thread
+        if not revocation_index.loaded:
+            return {"error": "Revocation index not loaded"}, 503
+
+        try:
+            status = revocation_index.status(serial)
+        except ValueError:
+            return {"error": "Invalid serial number"}, 400
         except Exception as e:
-            logging.error(f"Certificate retrieval failed: {str(e)}")
+            logging.error(f"Certificate status lookup failed: {str(e)}")
             return {"error": str(e)}, 500
 
+        return {"serial": serial, "status": status}, 404 if status == "unknown" else 200
+
+
+@timed("certutil_revoke")
+def revoke_with_certutil(serial, reason):
+    """Revoke a serial at the CA; returns an error string or None"""
+    result = subprocess.run(
+        ["certutil", "-revoke", serial, reason], capture_output=True, text=True
+    )
+    return None if result.returncode == 0 else result.stderr
+
+
+@timed("db_update_revoked")
+def mark_revoked(revocations):
+    """Record (serial, reason) pairs as revoked in a single transaction"""
+    revoked_date = datetime.now()
+
+    with db_pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+
+        cursor.executemany(
+            """
+            UPDATE Certificates
+            SET Status = 'Revoked', RevokedDate = ?, RevokedReason = ?
+            WHERE Serial = ?
+        """,
+            [(revoked_date, reason, serial) for serial, reason in revocations],
+        )
+
+        conn.commit()
+
+    for serial, _ in revocations:
+        certificate_cache.invalidate(normalise_serial(serial))
+    revocation_index.add(serial for serial, _ in revocations)
+    expiry_index.remove(serial for serial, _ in revocations)
+
 
 class CertificateRevocation(Resource):
     @jwt_required()
@@ -189,41 +1949,324 @@ class CertificateRevocation(Resource):
 
         try:
             # Call certutil to revoke certificate
-            result = subprocess.run(
-                ["certutil", "-revoke", serial, reason], capture_output=True, text=True
-            )
+            error = revoke_with_certutil(serial, reason)
 
-            if result.returncode == 0:
+            if error is None:
                 # Update database
-                conn = pyodbc.connect(conn_str)
-                cursor = conn.cursor()
-
-                cursor.execute(
-                    """
-                    UPDATE Certificates
-                    SET Status = 'Revoked', RevokedDate = ?, RevokedReason = ?
-                    WHERE Serial = ?
-                """,
-                    datetime.now(),
-                    reason,
-                    serial,
-                )
-
-                conn.commit()
-                conn.close()
+                mark_revoked([(serial, reason)])
 
                 return {
                     "status": "success",
                     "message": f"Certificate {serial} revoked",
                 }, 200
             else:
-                return {"error": result.stderr}, 500
+                return {"error": error}, 500
 
         except Exception as e:
             logging.error(f"Certificate revocation failed: {str(e)}")
             return {"error": str(e)}, 500
 
 
+# Batch revocation
+app.config["REVOKE_BATCH_MAX_ITEMS"] = 10000
+app.config["REVOKE_CONCURRENCY"] = 8  # concurrent certutil processes
+
+
+class CertificateRevocationBatch(Resource):
+    @jwt_required()
+    def post(self):
+        """Revoke a list of certificates, streaming progress as NDJSON"""
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            default_reason = data.get("reason", "unspecified")
+            items = data.get("revocations") or data.get("serials")
+        else:
+            default_reason = "unspecified"
+            items = data
+
+        if not isinstance(items, list):
+            return {"error": "revocations must be a non-empty list of serials"}, 400
+
+        items = [{"serial": item} if isinstance(item, str) else item for item in items]
+
+        if not items or not all(
+            isinstance(item, dict) and item.get("serial") for item in items
+        ):
+            return {"error": "revocations must be a non-empty list of serials"}, 400
+
+        if len(items) > app.config["REVOKE_BATCH_MAX_ITEMS"]:
+            return {
+                "error": f"Batch exceeds {app.config['REVOKE_BATCH_MAX_ITEMS']} serials"
+            }, 400
+
+        revocations = [
+            (item["serial"], item.get("reason", default_reason)) for item in items
+        ]
+
+        return Response(self.revoke_all(revocations), mimetype="application/x-ndjson")
+
+    def revoke_all(self, revocations):
+        """Generator yielding one progress line per serial and a final summary"""
+        revoked = []
+        revoked_lock = threading.Lock()
+
+        def revoke_one(serial, reason):
+            try:
+                error = revoke_with_certutil(serial, reason)
+            except Exception as e:
+                error = str(e)
+            if error is None:
+                with revoked_lock:
+                    revoked.append((serial, reason))
+            return error
+
+        workers = min(app.config["REVOKE_CONCURRENCY"], len(revocations))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {
+            executor.submit(revoke_one, serial, reason): (index, serial)
+            for index, (serial, reason) in enumerate(revocations)
+        }
+        finished = False
+        database_error = None
+
+        try:
+            yield json.dumps({"status": "started", "total": len(revocations)}) + "\n"
+
+            for future in as_completed(futures):
+                index, serial = futures[future]
+                error = future.result()
+                line = {"index": index, "serial": serial}
+                if error is None:
+                    line["status"] = "revoked"
+                else:
+                    line.update(status="error", error=error)
+                yield json.dumps(line) + "\n"
+
+            finished = True
+        finally:
+            # Runs even if the client disconnects, so every serial already
+            # revoked at the CA is recorded in the database
+            if not finished:
+                for future in futures:
+                    future.cancel()
+            executor.shutdown(wait=True)
+
+            if revoked:
+                try:
+                    mark_revoked(revoked)
+                except Exception as e:
+                    logging.error(f"Batch revocation database update failed: {str(e)}")
+                    database_error = str(e)
+
+        yield json.dumps(
+            {
+                "status": "complete",
+                "total": len(revocations),
+                "revoked": len(revoked),
+                "failed": len(revocations) - len(revoked),
+                "database_updated": database_error is None,
+                "error": database_error,
+            }
+        ) + "\n"
+
+
+# Certificate validation
+app.config["CA_CHAIN_FILE"] = "/etc/pki/ca-chain.pem"
+app.config["CA_CHAIN_RELOAD_INTERVAL"] = 30  # seconds between file change checks
+app.config["VALIDATION_CACHE_SIZE"] = 50000
+app.config["VALIDATION_CACHE_TTL"] = 300  # seconds
+
+MAX_CHAIN_DEPTH = 10
+
+# openssl verify's default "any" purpose: issuers must assert basicConstraints
+# cA (the verifier enforces it), but no keyUsage or extendedKeyUsage is needed
+CA_EXTENSION_POLICY = ExtensionPolicy.permit_all().require_present(
+    x509.BasicConstraints, Criticality.AGNOSTIC, None
+)
+EE_EXTENSION_POLICY = ExtensionPolicy.permit_all()
+
+
+class TrustStore:
+    """CA chain parsed once and reloaded when the file changes"""
+
+    def __init__(self, path, reload_interval=30):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.generation = 0  # bumped on every reload
+        self._store = None  # self-signed roots from the chain file
+        self._intermediates = []
+        self._subjects = set()  # DER-encoded subjects of every CA in the file
+        self._file_stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Parse the CA chain file, keeping the previous store on failure"""
+        with self._lock:
+            stat = os.stat(self.path)
+            with open(self.path, "rb") as f:
+                certs = x509.load_pem_x509_certificates(f.read())
+
+            roots = [cert for cert in certs if cert.subject == cert.issuer]
+            self._store = Store(roots) if roots else None
+            self._intermediates = [
+                cert for cert in certs if cert.subject != cert.issuer
+            ]
+            self._subjects = {cert.subject.public_bytes() for cert in certs}
+            self._file_stamp = (stat.st_mtime_ns, stat.st_size)
+            self._checked_at = time.monotonic()
+            self.generation += 1
+
+        logging.info(f"Loaded {len(certs)} CA certificates from {self.path}")
+
+    def refresh(self):
+        """Reload if the reload interval has passed and the file has changed"""
+        if self._file_stamp is not None and (
+            time.monotonic() - self._checked_at < self.reload_interval
+        ):
+            return
+
+        try:
+            stat = os.stat(self.path)
+            if (stat.st_mtime_ns, stat.st_size) != self._file_stamp:
+                self.load()
+            else:
+                self._checked_at = time.monotonic()
+        except (OSError, ValueError) as e:
+            if self._file_stamp is None:
+                raise
+            logging.error(f"CA chain reload failed, keeping current store: {str(e)}")
+            self._checked_at = time.monotonic()
+
+    def verify(self, cert, now=None):
+        """Verify cert up to a trusted root; returns an error string or None"""
+        now = now or datetime.now(timezone.utc)
+
+        # The common failures keep the messages openssl verify printed
+        if now < cert.not_valid_before_utc:
+            return "certificate is not yet valid"
+        if now > cert.not_valid_after_utc:
+            return "certificate has expired"
+        if cert.issuer.public_bytes() not in self._subjects or self._store is None:
+            if cert.issuer == cert.subject:
+                return "self-signed certificate"
+            return "unable to get local issuer certificate"
+
+        verifier = (
+            PolicyBuilder()
+            .store(self._store)
+            .time(now)
+            .max_chain_depth(MAX_CHAIN_DEPTH)
+            .extension_policies(
+                ca_policy=CA_EXTENSION_POLICY, ee_policy=EE_EXTENSION_POLICY
+            )
+            .build_client_verifier()
+        )
+        try:
+            verifier.verify(cert, self._intermediates)
+        except VerificationError as e:
+            return str(e)
+        return None
+
+
+trust_store = TrustStore(
+    app.config["CA_CHAIN_FILE"],
+    reload_interval=app.config["CA_CHAIN_RELOAD_INTERVAL"],
+)
+
+validation_cache = LRUCache(
+    max_entries=app.config["VALIDATION_CACHE_SIZE"],
+    ttl=app.config["VALIDATION_CACHE_TTL"],
+)
+
+
+# Names openssl prints where they differ from the RFC 4514 ones
+OPENSSL_ATTRIBUTE_NAMES = {
+    NameOID.EMAIL_ADDRESS: "emailAddress",
+    NameOID.SERIAL_NUMBER: "serialNumber",
+    NameOID.GIVEN_NAME: "GN",
+    NameOID.SURNAME: "SN",
+    NameOID.TITLE: "title",
+}
+
+
+def openssl_name(name):
+    """Name in openssl's default oneline form, e.g. C = AU, O = Company, CN = host"""
+
+    def escape(ch):
+        # Quotes and backslashes, then every non-ASCII or control byte as \XX
+        if ch in '"\\':
+            return "\\" + ch
+        if " " <= ch < "\x7f":
+            return ch
+        return "".join(f"\\{b:02X}" for b in ch.encode())
+
+    def attribute_text(attribute):
+        label = OPENSSL_ATTRIBUTE_NAMES.get(
+            attribute.oid, attribute.rfc4514_attribute_name
+        )
+        value = str(attribute.value)
+        # Values holding separators or edge spaces are quoted, not escaped
+        quote = (
+            value.startswith(("#", " "))
+            or value.endswith(" ")
+            or any(ch in value for ch in ",+<>;")
+        )
+        value = "".join(escape(ch) for ch in value)
+        return f'{label} = "{value}"' if quote else f"{label} = {value}"
+
+    # Issue order, unlike rfc4514_string() which reverses the RDNs
+    return ", ".join(
+        " + ".join(attribute_text(attribute) for attribute in rdn) for rdn in name.rdns
+    )
+
+
+def certificate_details(cert):
+    """Subject, issuer, serial and dates in openssl x509 -noout layout"""
+
+    def openssl_date(value):
+        return f"{value:%b} {value.day:2d} {value:%H:%M:%S %Y} GMT"
+
+    # openssl pads the serial to whole bytes
+    serial = f"{cert.serial_number:X}"
+    return (
+        f"subject={openssl_name(cert.subject)}\n"
+        f"issuer={openssl_name(cert.issuer)}\n"
+        f"serial={serial.zfill(len(serial) + len(serial) % 2)}\n"
+        f"notBefore={openssl_date(cert.not_valid_before_utc)}\n"
+        f"notAfter={openssl_date(cert.not_valid_after_utc)}\n"
+    )
+
+
+def validate_certificate(cert_pem):
+    """Validate a PEM certificate against the trust store, using cached verdicts"""
+    trust_store.refresh()
+
+    try:
+        cert = x509.load_pem_x509_certificate(cert_pem.encode())
+    except ValueError:
+        return {"valid": False, "error": "unable to load certificate"}
+
+    key = (trust_store.generation, cert.fingerprint(hashes.SHA256()))
+    verdict = validation_cache.get(key)
+    if verdict is not None:
+        return verdict
+
+    with timed("chain_verify"):
+        error = trust_store.verify(cert)
+    if error is None:
+        verdict = {"valid": True, "details": certificate_details(cert)}
+    else:
+        verdict = {"valid": False, "error": error}
+
+    # Never cache a verdict past the point the certificate expires
+    remaining = (cert.not_valid_after_utc - datetime.now(timezone.utc)).total_seconds()
+    if remaining > 0:
+        validation_cache.put(key, verdict, ttl=min(validation_cache.ttl, remaining))
+
+    return verdict
+
+
 class CertificateValidation(Resource):
     def post(self):
         """Validate certificate chain"""
@@ -234,48 +2277,167 @@ class CertificateValidation(Resource):
             return {"error": "Certificate required"}, 400
 
         try:
-            # Write certificate to temp file
-            with open("/tmp/cert.pem", "w") as f:
-                f.write(cert_pem)
-
-            # Validate against CA chain
-            result = subprocess.run(
-                [
-                    "openssl",
-                    "verify",
-                    "-CAfile",
-                    "/etc/pki/ca-chain.pem",
-                    "/tmp/cert.pem",
-                ],
-                capture_output=True,
-                text=True,
-            )
+            return validate_certificate(cert_pem), 200
 
-            if result.returncode == 0:
-                # Parse certificate details
-                cert_info = subprocess.run(
-                    [
-                        "openssl",
-                        "x509",
-                        "-in",
-                        "/tmp/cert.pem",
-                        "-noout",
-                        "-subject",
-                        "-issuer",
-                        "-serial",
-                        "-dates",
-                    ],
-                    capture_output=True,
-                    text=True,
-                )
+        except Exception as e:
+            logging.error(f"Certificate validation failed: {str(e)}")
+            return {"error": str(e)}, 500
 
-                return {"valid": True, "details": cert_info.stdout}, 200
-            else:
-                return {"valid": False, "error": result.stderr}, 200
 
+# Batch certificate validation
+app.config["VALIDATE_BATCH_MAX_ITEMS"] = 100000
+app.config["VALIDATE_BATCH_CONCURRENCY"] = 8
+app.config["VALIDATE_BATCH_WINDOW"] = 256  # certificates in flight per request
+app.config["VALIDATE_BATCH_MAX_BYTES"] = 256 * 1024 * 1024  # NDJSON body limit
+app.config["VALIDATE_BATCH_SPOOL_MEMORY"] = 8 * 1024 * 1024  # then spill to disk
+
+
+class CertificateValidationBatch(Resource):
+    # Stands in for an NDJSON line that does not parse
+    INVALID_LINE = object()
+
+    def post(self):
+        """Validate many certificates, streaming one NDJSON verdict each"""
+        if request.mimetype == "application/x-ndjson":
+            # Spool the body before streaming verdicts: reading the request
+            # while writing the response stalls clients that send it all
+            # before reading anything
+            spool = self.spool_body(request.stream)
+            if spool is None:
+                return {
+                    "error": f"Body exceeds {app.config['VALIDATE_BATCH_MAX_BYTES']} "
+                    "bytes"
+                }, 413
+            items = self.read_ndjson(spool)
+        else:
+            spool = None
+            data = request.get_json(silent=True)
+            items = data.get("certificates") if isinstance(data, dict) else data
+
+            if not isinstance(items, list) or not items:
+                return {"error": "certificates must be a non-empty list of PEMs"}, 400
+
+            if len(items) > app.config["VALIDATE_BATCH_MAX_ITEMS"]:
+                return {
+                    "error": f"Batch exceeds {app.config['VALIDATE_BATCH_MAX_ITEMS']} "
+                    "certificates"
+                }, 400
+
+        response = Response(
+            stream_with_context(self.validate_all(items)),
+            mimetype="application/x-ndjson",
+        )
+        if spool is not None:
+            response.call_on_close(spool.close)
+        return response
+
+    @staticmethod
+    def spool_body(stream, chunk_size=65536):
+        """Copy stream to a rewound temporary file, or None if it is too large"""
+        max_bytes = app.config["VALIDATE_BATCH_MAX_BYTES"]
+        if (request.content_length or 0) > max_bytes:
+            return None
+
+        spool = tempfile.SpooledTemporaryFile(
+            max_size=app.config["VALIDATE_BATCH_SPOOL_MEMORY"]
+        )
+        size = 0
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                spool.close()
+                return None
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    @classmethod
+    def read_ndjson(cls, stream):
+        """Yield each non-blank line as JSON, or INVALID_LINE if it does not parse"""
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield cls.INVALID_LINE
+
+    @classmethod
+    def validate_one(cls, item):
+        """Verdict for a PEM string or {"id": ..., "certificate": PEM}"""
+        if item is cls.INVALID_LINE:
+            return {"valid": False, "error": "Invalid JSON line"}
+
+        cert_pem = item.get("certificate") if isinstance(item, dict) else item
+
+        if not isinstance(cert_pem, str) or not cert_pem:
+            return {"valid": False, "error": "Certificate required"}
+
+        try:
+            return validate_certificate(cert_pem)
         except Exception as e:
             logging.error(f"Certificate validation failed: {str(e)}")
-            return {"error": str(e)}, 500
+            return {"valid": False, "error": str(e)}
+
+    def validate_all(self, items):
+        """Generator yielding verdicts as they finish, then a summary"""
+        limit = app.config["VALIDATE_BATCH_MAX_ITEMS"]
+        window = app.config["VALIDATE_BATCH_WINDOW"]
+        executor = ThreadPoolExecutor(
+            max_workers=app.config["VALIDATE_BATCH_CONCURRENCY"]
+        )
+        items = enumerate(items)
+        pending = {}
+        exhausted = False
+        error = None
+        counts = {"valid": 0, "invalid": 0}
+
+        try:
+            while True:
+                # Keep the window full; later input is read only as it drains
+                while not exhausted and len(pending) < window:
+                    index, item = next(items, (None, None))
+                    if index is None:
+                        exhausted = True
+                    elif index >= limit:
+                        error = f"Batch exceeds {limit} certificates"
+                        exhausted = True
+                    else:
+                        future = executor.submit(self.validate_one, item)
+                        item_id = item.get("id") if isinstance(item, dict) else None
+                        pending[future] = (index, item_id)
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item_id = pending.pop(future)
+                    verdict = future.result()
+                    counts["valid" if verdict["valid"] else "invalid"] += 1
+
+                    line = {"index": index}
+                    if item_id is not None:
+                        line["id"] = item_id
+                    line.update(verdict)
+                    yield json.dumps(line) + "\n"
+        finally:
+            # Client went away: drop queued work rather than finishing it
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+        yield json.dumps(
+            {
+                "status": "complete" if error is None else "truncated",
+                "total": counts["valid"] + counts["invalid"],
+                **counts,
+                "error": error,
+            }
+        ) + "\n"
 
 
 # Authentication endpoint
@@ -293,11 +2455,73 @@ def authenticate():
         return jsonify(error="Invalid credentials"), 401
 
 
+# Connection and key pool statistics
+@app.route("/api/pool", methods=["GET"])
+@jwt_required()
+def pool_stats():
+    return jsonify(db=db_pool.stats(), keys=key_pool.stats()), 200
+
+
+# Prometheus metrics
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    pool = db_pool.stats()
+    metrics.set("pki_db_pool_connections", pool["idle"], state="idle")
+    metrics.set("pki_db_pool_connections", pool["in_use"], state="in_use")
+
+    for name, cache in (
+        ("certificates", certificate_cache),
+        ("validation", validation_cache),
+    ):
+        stats = cache.stats()
+        metrics.set("pki_cache_hits_total", stats["hits"], cache=name)
+        metrics.set("pki_cache_misses_total", stats["misses"], cache=name)
+        metrics.set("pki_cache_entries", stats["entries"], cache=name)
+
+    for key_type, available in key_pool.stats()["available"].items():
+        metrics.set("pki_key_pool_available", available, key_type=key_type)
+
+    metrics.set("pki_audit_buffered_rows", audit_writer.stats()["buffered"])
+
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Cache statistics
+@app.route("/api/cache", methods=["GET"])
+@jwt_required()
+def cache_stats():
+    return (
+        jsonify(
+            certificates=certificate_cache.stats(),
+            validation=validation_cache.stats(),
+            revocation=revocation_index.stats(),
+            audit=audit_writer.stats(),
+            expiry=expiry_index.stats(),
+        ),
+        200,
+    )
+
+
 # API endpoints
 api.add_resource(CertificateRequest, "/api/certificate/request")
+api.add_resource(CertificateRequestBatch, "/api/certificate/request/batch")
+api.add_resource(CertificateRequestStatus, "/api/certificate/request/<string:job_id>")
+api.add_resource(CertificateExpiring, "/api/certificate/expiring")
 api.add_resource(CertificateRetrieval, "/api/certificate/<string:serial>")
 api.add_resource(CertificateRevocation, "/api/certificate/<string:serial>/revoke")
+api.add_resource(CertificateStatus, "/api/certificate/<string:serial>/status")
+api.add_resource(CertificateRevocationBatch, "/api/certificate/revoke/batch")
 api.add_resource(CertificateValidation, "/api/certificate/validate")
+api.add_resource(CertificateValidationBatch, "/api/certificate/validate/batch")
 
 if __name__ == "__main__":
+    # Exit through atexit on SIGTERM so buffered audit rows are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    db_pool.prefill()
+    key_pool.start()
+    audit_writer.start()
+    trust_store.load()
+    revocation_index.start()
+    expiry_index.start()
     app.run(host="0.0.0.0", port=5000, ssl_context="adhoc")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# pki_transport.py
+# Shared HTTP transport for the PKI integration scripts
+#
+# Imported by cisco-scep-enrollment.py, configure-netscaler-ssl.py,
+# zscaler-pki-integration.py and pki-api-service.py; keep it next to them.
+
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (5, 30)  # connect, read seconds
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # seconds, doubled per retry
+RETRY_STATUSES = (502, 503, 504)
+
+_timing_hooks = []
+
+
+def add_timing_hook(callback):
+    """Call callback(client, method, host, status, seconds) after every response"""
+    _timing_hooks.append(callback)
+
+
+class TransportAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout when a call sets none"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session(
+    client,
+    pool_size=10,
+    hosts=10,
+    timeout=DEFAULT_TIMEOUT,
+    retries=DEFAULT_RETRIES,
+    backoff=DEFAULT_BACKOFF,
+    retry_statuses=RETRY_STATUSES,
+    retry_methods=Retry.DEFAULT_ALLOWED_METHODS,
+    verify=True,
+):
+    """requests.Session with keep-alive pools, default timeouts and retries.
+
+    client names the caller in timing hooks. Up to hosts per-host pools of
+    pool_size connections are kept. Connection errors and retry_statuses
+    are retried with exponential backoff (honouring Retry-After) for
+    retry_methods, which are the idempotent methods unless overridden.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=retry_statuses,
+        allowed_methods=retry_methods,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TransportAdapter(
+        timeout=timeout,
+        pool_connections=hosts,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.verify = verify
+    session.hooks["response"].append(
+        lambda response, *args, **kwargs: _report_timing(client, response)
+    )
+    return session
+
+
+def _report_timing(client, response):
+    # elapsed runs from sending the request to parsing the response headers
+    host = urlsplit(response.url).hostname
+    seconds = response.elapsed.total_seconds()
+    for hook in _timing_hooks:
+        try:
+            hook(client, response.request.method, host, response.status_code, seconds)
+        except Exception as e:
+            logging.warning(f"Timing hook failed: {str(e)}")
+
+
+class TimingStats:
+    """Timing hook that totals call counts and latency per client and host"""
+
+    def __init__(self):
+        self._stats = {}  # (client, host) -> [calls, total seconds, max seconds]
+        self._lock = threading.Lock()
+
+    def __call__(self, client, method, host, status, seconds):
+        with self._lock:
+            stats = self._stats.setdefault((client, host), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def summary(self):
+        """{"client host": {"calls", "mean_ms", "max_ms"}}"""
+        with self._lock:
+            return {
+                f"{client} {host}": {
+                    "calls": calls,
+                    "mean_ms": round(total / calls * 1000, 1),
+                    "max_ms": round(slowest * 1000, 1),
+                }
+                for (client, host), (calls, total, slowest) in sorted(
+                    self._stats.items()
+                )
+            }
@@ -1,22 +1,200 @@
 # Python script for Zscaler API integration
-import requests
+import argparse
 import json
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 import base64
+import os
+import random
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pki_transport
+
+try:
+    import fcntl
+except ImportError:  # Windows: cache file used without a cross-process lock
+    fcntl = None
+
+# ZIA API write quotas; raise to match the tenant's agreed limits
+RATE_LIMIT_PER_SECOND = 1
+RATE_LIMIT_PER_HOUR = 400
+
+# ZIA drops idle sessions after 30 minutes; stop reusing a cached one before
+SESSION_TTL = 25 * 60
+SESSION_CACHE = os.path.expanduser("~/.zscaler-session.json")
+
+SSL_EXEMPTIONS = [
+    {"url": "ocsp.company.com", "description": "Company OCSP Responder"},
+    {"url": "crl.company.com", "description": "Company CRL Distribution"},
+    {"url": "pki.company.com", "description": "PKI Web Enrollment"},
+    {"url": "*.digicert.com", "description": "DigiCert Services"},
+    {"url": "*.microsoft.com/pki/*", "description": "Microsoft PKI Services"},
+]
+
+DEVICE_CERTIFICATE_PROFILE = {
+    "name": "Company-Device-Certificate",
+    "description": "Company managed device certificates",
+    "certificateAttributes": {
+        "cn": "*.company.com",
+        "ou": "IT Department",
+        "o": "Company Inc",
+    },
+    "validationRules": [
+        {"type": "OCSP", "url": "http://ocsp.company.com/ocsp"},
+        {"type": "CRL", "url": "http://crl.company.com/crl/IssuingCA01.crl"},
+    ],
+    "requireStrictValidation": True,
+}
+
+
+def _normalise_url(url):
+    return url.strip().lower()
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second up to capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Drain the bucket so no request goes out for seconds"""
+        with self.lock:
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
 
 
 class ZscalerPKIIntegration:
-    def __init__(self, cloud, api_key, username, password):
+    def __init__(
+        self,
+        cloud,
+        api_key,
+        username,
+        password,
+        per_second=RATE_LIMIT_PER_SECOND,
+        per_hour=RATE_LIMIT_PER_HOUR,
+        concurrency=8,
+        max_retries=5,
+        session_cache=SESSION_CACHE,
+    ):
         self.base_url = f"https://zsapi.{cloud}.net/api/v1"
         self.api_key = api_key
         self.username = username
         self.password = password
         self.session = None
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.session_cache = session_cache  # None disables the on-disk cache
+        self.session_expires = 0
+        self.auth_lock = threading.Lock()
+
+        # One pooled connection set shared by every request and thread
+        # 429 and 5xx are retried by request() so every worker backs off
+        self.http = pki_transport.create_session(
+            "zscaler", pool_size=concurrency, hosts=1, retry_statuses=()
+        )
 
-    def authenticate(self):
-        """Authenticate to Zscaler API"""
+        # Both quotas apply; a request needs a token from each
+        self.buckets = [
+            TokenBucket(per_second, per_second),
+            TokenBucket(per_hour / 3600, per_hour),
+        ]
+
+    def request(self, method, path, **kwargs):
+        """Send an API request within the rate limits, retrying 429 and 5xx"""
+        for attempt in range(self.max_retries + 1):
+            for bucket in self.buckets:
+                bucket.acquire()
+
+            session = self.session
+            response = self.http.request(method, f"{self.base_url}/{path}", **kwargs)
+
+            if response.status_code == 401 and attempt < self.max_retries:
+                # Session expired or was revoked: log in again and retry
+                if not self.authenticate(stale=session):
+                    return response
+                continue
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            if attempt == self.max_retries:
+                return response
+
+            delay = self._retry_after(response)
+            if delay is None:
+                delay = 2**attempt * random.uniform(0.5, 1.5)
+            if response.status_code == 429:
+                # Throttled: hold back every thread, not just this one
+                self.buckets[0].pause(delay)
+            else:
+                time.sleep(delay)
+
+    @staticmethod
+    def _retry_after(response):
+        # Header in seconds, or a JSON body such as {"Retry-After": "2 seconds"}
+        value = response.headers.get("Retry-After")
+        if value is None:
+            try:
+                value = response.json().get("Retry-After")
+            except (ValueError, AttributeError):
+                return None
+        match = re.match(r"\s*(\d+)", str(value or ""))
+        return int(match.group(1)) if match else None
+
+    def authenticate(self, stale=None):
+        """Authenticate to Zscaler API, reusing a cached session if still valid.
+
+        stale is a session the caller saw rejected; it is never reused.
+        """
+        with self.auth_lock:
+            if (
+                self.session
+                and self.session != stale
+                and time.time() < self.session_expires
+            ):
+                return True
+
+            with self._cache_locked() as cache:
+                entry = cache.get(self._cache_key())
+                if (
+                    entry
+                    and entry["jsessionid"] != stale
+                    and time.time() < entry["expires"]
+                    and self._session_valid(entry["jsessionid"])
+                ):
+                    self._use_session(entry["jsessionid"], entry["expires"])
+                    return True
+
+                if not self._login():
+                    return False
+                cache[self._cache_key()] = {
+                    "jsessionid": self.session,
+                    "expires": self.session_expires,
+                }
+                return True
+
+    def _login(self):
         auth_url = f"{self.base_url}/authenticatedSession"
 
         # Obfuscate credentials
@@ -30,16 +208,60 @@ class ZscalerPKIIntegration:
             "timestamp": timestamp,
         }
 
-        response = requests.post(auth_url, json=payload)
+        response = self.http.post(auth_url, json=payload)
         if response.status_code == 200:
-            self.session = response.cookies.get("JSESSIONID")
+            self._use_session(
+                response.cookies.get("JSESSIONID"), time.time() + SESSION_TTL
+            )
             return True
         return False
 
+    def _use_session(self, jsessionid, expires):
+        self.session = jsessionid
+        self.session_expires = expires
+        self.http.cookies.set("JSESSIONID", jsessionid)
+
+    def _session_valid(self, jsessionid):
+        # GET on the session resource is cheap and fails once it has expired
+        response = self.http.get(
+            f"{self.base_url}/authenticatedSession",
+            cookies={"JSESSIONID": jsessionid},
+        )
+        return response.status_code == 200
+
+    def _cache_key(self):
+        return f"{self.username}@{self.base_url}"
+
+    @contextmanager
+    def _cache_locked(self):
+        """Cached sessions, held under an exclusive lock and saved on exit"""
+        if not self.session_cache:
+            yield {}
+            return
+
+        fd = os.open(self.session_cache, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "r+") as f:
+            # Serialises logins across concurrent cron runs
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                cache = json.loads(f.read() or "{}")
+            except ValueError:
+                cache = {}
+            before = dict(cache)
+
+            yield cache
+
+            if cache != before:
+                now = time.time()
+                cache = {k: v for k, v in cache.items() if v["expires"] > now}
+                f.seek(0)
+                f.truncate()
+                json.dump(cache, f)
+                f.flush()
+
     def upload_intermediate_ca(self, cert_path):
         """Upload intermediate CA certificate to Zscaler"""
-        url = f"{self.base_url}/sslSettings/intermediateCaCert"
-
         with open(cert_path, "rb") as f:
             cert_data = f.read()
 
@@ -51,63 +273,157 @@ class ZscalerPKIIntegration:
             "certificateUsage": "INTERMEDIATE_CA",
         }
 
-        headers = {"Cookie": f"JSESSIONID={self.session}"}
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.request("POST", "sslSettings/intermediateCaCert", json=payload)
 
         return response.json()
 
-    def configure_ssl_inspection_policy(self):
+    def configure_ssl_inspection_policy(self, exemptions=None):
         """Configure SSL inspection exemptions for certificate services"""
-        url = f"{self.base_url}/sslSettings/exemptedUrls"
-
-        exemptions = [
-            {"url": "ocsp.company.com", "description": "Company OCSP Responder"},
-            {"url": "crl.company.com", "description": "Company CRL Distribution"},
-            {"url": "pki.company.com", "description": "PKI Web Enrollment"},
-            {"url": "*.digicert.com", "description": "DigiCert Services"},
-            {"url": "*.microsoft.com/pki/*", "description": "Microsoft PKI Services"},
-        ]
-
-        headers = {"Cookie": f"JSESSIONID={self.session}"}
+        exemptions = exemptions or SSL_EXEMPTIONS
 
-        for exemption in exemptions:
-            response = requests.post(url, json=exemption, headers=headers)
+        def add(exemption):
+            response = self.request("POST", "sslSettings/exemptedUrls", json=exemption)
             print(f"Added exemption for {exemption['url']}: {response.status_code}")
+            return exemption["url"], response.status_code
+
+        # Concurrent, but the token buckets keep the pace within quota
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return dict(executor.map(add, exemptions))
 
     def configure_client_certificate_policy(self):
         """Configure ZPA client certificate requirements"""
-        url = f"{self.base_url}/clientCertificate/profiles"
-
-        profile = {
-            "name": "Company-Device-Certificate",
-            "description": "Company managed device certificates",
-            "certificateAttributes": {
-                "cn": "*.company.com",
-                "ou": "IT Department",
-                "o": "Company Inc",
-            },
-            "validationRules": [
-                {"type": "OCSP", "url": "http://ocsp.company.com/ocsp"},
-                {"type": "CRL", "url": "http://crl.company.com/crl/IssuingCA01.crl"},
-            ],
-            "requireStrictValidation": True,
-        }
+        profile = DEVICE_CERTIFICATE_PROFILE
 
-        headers = {"Cookie": f"JSESSIONID={self.session}"}
-        response = requests.post(url, json=profile, headers=headers)
+        response = self.request("POST", "clientCertificate/profiles", json=profile)
 
         return response.json()
 
+    def sync_ssl_exemptions(self, exemptions=None, remove=True, chunk_size=100):
+        """Send only the exemption adds and removes, in bulk list actions"""
+        # Compared normalised, but sent as written: the API matches exactly
+        desired = {
+            _normalise_url(e["url"]): e["url"].strip()
+            for e in exemptions or SSL_EXEMPTIONS
+        }
+
+        response = self.request("GET", "sslSettings/exemptedUrls")
+        if response.status_code != 200:
+            raise Exception(f"Failed to read exemptions: {response.status_code}")
+        body = response.json()
+        urls = body.get("urls", []) if isinstance(body, dict) else body
+        current = {}  # normalised -> every spelling the server holds
+        for u in urls:
+            url = u if isinstance(u, str) else u["url"]
+            current.setdefault(_normalise_url(url), []).append(url)
 
-# Execute Zscaler configuration
-zscaler = ZscalerPKIIntegration(
-    cloud="zscaler.net",
-    api_key="YOUR_API_KEY",
-    username="admin@company.com",
-    password="secure_password",
-)
+        changes = {
+            "ADD_TO_LIST": sorted(
+                desired[url] for url in desired.keys() - current.keys()
+            ),
+            "REMOVE_FROM_LIST": (
+                sorted(
+                    original
+                    for url in current.keys() - desired.keys()
+                    for original in current[url]
+                )
+                if remove
+                else []
+            ),
+        }
+        for action, changed in changes.items():
+            for start in range(0, len(changed), chunk_size):
+                response = self.request(
+                    "POST",
+                    f"sslSettings/exemptedUrls?action={action}",
+                    json={"urls": changed[start : start + chunk_size]},
+                )
+                if response.status_code not in [200, 204]:
+                    raise Exception(
+                        f"Exemption {action} failed: {response.status_code}"
+                    )
+
+        return {
+            "added": changes["ADD_TO_LIST"],
+            "removed": changes["REMOVE_FROM_LIST"],
+        }
+
+    def sync_client_certificate_profiles(self, profiles=None):
+        """Create missing profiles and update those whose settings differ"""
+        response = self.request("GET", "clientCertificate/profiles")
+        if response.status_code != 200:
+            raise Exception(f"Failed to read profiles: {response.status_code}")
+        current = {p["name"]: p for p in response.json()}
+
+        changes = {}
+        for profile in profiles or [DEVICE_CERTIFICATE_PROFILE]:
+            existing = current.get(profile["name"])
+
+            if existing is None:
+                response = self.request(
+                    "POST", "clientCertificate/profiles", json=profile
+                )
+                changes[profile["name"]] = "created"
+            elif {key: existing.get(key) for key in profile} != profile:
+                # Only fields we manage are compared; server-side ones are ignored
+                response = self.request(
+                    "PUT",
+                    f"clientCertificate/profiles/{existing['id']}",
+                    json={**profile, "id": existing["id"]},
+                )
+                changes[profile["name"]] = "updated"
+            else:
+                continue
+
+            if response.status_code not in [200, 201, 204]:
+                raise Exception(
+                    f"Profile {profile['name']} sync failed: {response.status_code}"
+                )
+
+        return changes
+
+
+def main(argv=None):
+    """Push the Zscaler PKI configuration"""
+    parser = argparse.ArgumentParser(description="Zscaler PKI integration")
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="fetch current exemptions and profiles and send only the differences",
+    )
+    parser.add_argument("--session-cache", default=SESSION_CACHE)
+    args = parser.parse_args(argv)
+
+    timings = pki_transport.TimingStats()
+    pki_transport.add_timing_hook(timings)
+
+    zscaler = ZscalerPKIIntegration(
+        cloud="zscaler.net",
+        api_key="YOUR_API_KEY",
+        username="admin@company.com",
+        password="secure_password",
+        session_cache=args.session_cache,
+    )
+
+    if not zscaler.authenticate():
+        print("Authentication failed")
+        return 1
 
-if zscaler.authenticate():
     zscaler.upload_intermediate_ca("/path/to/IssuingCA01.crt")
-    zscaler.configure_ssl_inspection_policy()
-    zscaler.configure_client_certificate_policy()
\ No newline at end of file
+    if args.sync:
+        exemption_changes = zscaler.sync_ssl_exemptions()
+        print(
+            f"Exemptions: {len(exemption_changes['added'])} added, "
+            f"{len(exemption_changes['removed'])} removed"
+        )
+        for name, change in zscaler.sync_client_certificate_profiles().items():
+            print(f"Profile {name}: {change}")
+    else:
+        zscaler.configure_ssl_inspection_policy()
+        zscaler.configure_client_certificate_policy()
+
+    print(json.dumps(timings.summary(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())